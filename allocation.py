@@ -0,0 +1,69 @@
+import bisect
+import random
+
+from organization import Organization
+
+#Batch market clearing, the alternative to every organization calling book_venues in turn.
+#All demand for the round is collected first, then each time slot is cleared in one pass: requests are served in
+#reputation order, each taking a uniformly random free venue it can afford (and a second one when overbooking).
+#An organization commits an equal share of its budget to each of its scheduled slots up front, so no slot's outcome
+#depends on another's and slots can be cleared in any order, or in parallel.
+#clear_slot works on plain venue and organization positions so it can be shipped to worker processes.
+
+
+def split_budget(budget, num_slots):
+    #equal whole shares, with the remainder going to the earliest slots
+    share, remainder = divmod(int(budget), num_slots)
+    return [share + (i < remainder) for i in range(num_slots)]
+
+
+def clear_slot(requests, free, seed, enable_mechanism=False, room=None):
+    #requests: (organization position, budget share, venues wanted) in priority order.
+    #free: venue positions by popularity level that can take a booking in this slot (every venue not yet full with the mechanism).
+    #room: with the mechanism, how many more organizations each venue position with a sharing capacity can take here.
+    #Returns the allocations as (organization, venue, level, overbooked) and the unserved requests as (organization, reason).
+    rng = random.Random(seed)
+    levels = sorted(free)
+    buckets = [list(free[level]) for level in levels]
+    room = dict(room) if room else None
+    allocations = []
+    rejections = []
+    for org, allowance, wanted in requests:
+        excluded = None
+        for extra in range(wanted):
+            #the venues this request can afford are the buckets up to its budget share's popularity level
+            affordable = bisect.bisect_right(levels, allowance // Organization.COST_PER_LEVEL)
+            total = sum(len(bucket) for bucket in buckets[:affordable])
+            #with the mechanism nothing is taken out, so the second venue skips over the first one instead
+            skip = excluded is not None and excluded < total
+            if total - skip <= 0:
+                if extra == 0:
+                    rejections.append((org, "budget" if any(buckets) else "no_venue"))
+                break
+            draw = rng.randrange(total - skip)
+            if skip and draw >= excluded:
+                draw += 1
+            flat = draw
+            for b, bucket in enumerate(buckets):
+                if draw < len(bucket):
+                    break
+                draw -= len(bucket)
+            level = levels[b]
+            venue = bucket[draw]
+            allocations.append((org, venue, level, extra > 0))
+            allowance -= level * Organization.COST_PER_LEVEL
+            if not enable_mechanism:
+                filled = True
+            elif room is not None and venue in room:
+                room[venue] -= 1
+                filled = room[venue] == 0
+            else:
+                filled = False
+            if filled:
+                #taken (or, with the mechanism, full) venues leave the slot; the last venue fills the gap
+                bucket[draw] = bucket[-1]
+                bucket.pop()
+                excluded = None
+            else:
+                excluded = flat
+    return allocations, rejections
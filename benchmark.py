@@ -0,0 +1,174 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from simulation import Simulation
+from events import EventLog, OFF
+
+#phases of Simulation.run, in the order they run each round
+PHASES = (
+    "generate_schedules",
+    "organization_bookings",
+    "university_cancellations",
+    "allocate_reserve_venues",
+    "apply_mechanism",
+    "count_unmet_demand",
+    "score_organizations",
+    "update_reputations",
+    "update_strategies",
+    "check_nash_equilibrium",
+)
+
+DEFAULT_SCALES = (10, 100, 1000, 10000)
+DEFAULT_SEED = 12345
+
+
+def build_simulation(scale, enable_mechanism, engine, population):
+    #the same number of organizations and venues, with the cancellation rate main.py uses by default
+    sim = Simulation(scale, scale, 1, 0.3, enable_mechanism=enable_mechanism, engine=engine, population=population,
+                     seed=DEFAULT_SEED, log=EventLog(OFF), nash_interval=0)
+    sim.reset_simulation()
+    return sim
+
+
+def time_round(sim, check_nash):
+    #one round of Simulation.run with every phase timed separately
+    timings = {}
+
+    def timed(phase, *args):
+        start = time.perf_counter()
+        getattr(sim, phase)(*args)
+        timings[phase] = time.perf_counter() - start
+
+    timed("generate_schedules")
+    start = time.perf_counter()
+    round_start = sim.snapshot() if check_nash else None
+    snapshot_time = time.perf_counter() - start
+    sim.reset_venues()
+    timed("organization_bookings")
+    timed("university_cancellations")
+    timed("allocate_reserve_venues")
+    timed("apply_mechanism")
+    timed("count_unmet_demand")
+    timed("score_organizations")
+    timed("update_reputations")
+    timed("update_strategies")
+    if check_nash:
+        timed("check_nash_equilibrium", round_start)
+        #taking the start-of-round snapshot is part of what the check costs
+        timings["check_nash_equilibrium"] += snapshot_time
+    else:
+        timings["check_nash_equilibrium"] = None
+    return timings
+
+
+def peak_memory(scale, enable_mechanism, engine, population, check_nash):
+    #measured in a separate round because tracemalloc slows down everything it traces
+    tracemalloc.start()
+    sim = build_simulation(scale, enable_mechanism, engine, population)
+    time_round(sim, check_nash)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def benchmark_scale(scale, enable_mechanism, engine, population, rounds, nash_max_orgs):
+    check_nash = scale <= nash_max_orgs
+    sim = build_simulation(scale, enable_mechanism, engine, population)
+    samples = [time_round(sim, check_nash) for _ in range(rounds)]
+    phases = {}
+    for phase in PHASES:
+        values = [sample[phase] for sample in samples]
+        phases[phase] = None if values[0] is None else statistics.median(values)
+    return {
+        "scale": scale,
+        "enable_mechanism": enable_mechanism,
+        "phases": phases,
+        "round_total": sum(value for value in phases.values() if value is not None),
+        "peak_memory_bytes": peak_memory(scale, enable_mechanism, engine, population, check_nash),
+    }
+
+
+def run_benchmarks(scales, mechanisms, engine, population, rounds, nash_max_orgs):
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "engine": engine,
+            "population": population,
+            "rounds": rounds,
+            "seed": DEFAULT_SEED,
+            "nash_max_orgs": nash_max_orgs,
+        },
+        "results": [benchmark_scale(scale, mechanism, engine, population, rounds, nash_max_orgs)
+                    for scale in scales for mechanism in mechanisms],
+    }
+
+
+def compare(report, baseline, threshold, min_delta=0.001):
+    #list of phases that got slower than the baseline by more than threshold (a fraction, 0.2 = 20%)
+    #and by at least min_delta seconds, so timer noise on sub-millisecond phases is not flagged
+    baseline_results = {(result["scale"], result["enable_mechanism"]): result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        previous = baseline_results.get((result["scale"], result["enable_mechanism"]))
+        if previous is None:
+            continue
+        for phase, seconds in list(result["phases"].items()) + [("round_total", result["round_total"])]:
+            before = previous["phases"].get(phase) if phase != "round_total" else previous["round_total"]
+            if seconds is None or not before:
+                continue
+            if seconds > before * (1 + threshold) and seconds - before >= min_delta:
+                regressions.append({"scale": result["scale"], "enable_mechanism": result["enable_mechanism"],
+                                    "phase": phase, "baseline": before, "current": seconds, "ratio": seconds / before})
+    return regressions
+
+
+def print_report(report):
+    for result in report["results"]:
+        label = "with mechanism" if result["enable_mechanism"] else "without mechanism"
+        print(f"\nScale {result['scale']} ({label}), peak memory {result['peak_memory_bytes'] / 1e6:.1f} MB")
+        for phase, seconds in result["phases"].items():
+            print(f"  {phase}: {'skipped' if seconds is None else f'{seconds * 1000:.2f} ms'}")
+        print(f"  round total: {result['round_total'] * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each Simulation phase across a ladder of scales.")
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES), help='Numbers of organizations (and venues) to benchmark')
+    parser.add_argument('--rounds', type=int, default=3, help='Timed rounds per scale; the median is reported')
+    parser.add_argument('--mechanism', choices=['without', 'with', 'both'], default='both', help='Which venue sharing arm to benchmark')
+    parser.add_argument('--engine', choices=Simulation.ENGINES, default='objects', help='Venue occupancy engine')
+    parser.add_argument('--population', choices=Simulation.POPULATIONS, default='objects', help='Organization state storage')
+    parser.add_argument('--nash-max-orgs', type=int, default=100, help='Skip the Nash check above this many organizations (it replays a round per organization)')
+    parser.add_argument('--output', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='Compare against a previously saved JSON file and flag regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Slowdown fraction over the baseline counted as a regression')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore slowdowns smaller than this many milliseconds')
+    args = parser.parse_args()
+
+    mechanisms = {"without": [False], "with": [True], "both": [False, True]}[args.mechanism]
+    report = run_benchmarks(args.scales, mechanisms, args.engine, args.population, args.rounds, args.nash_max_orgs)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.threshold, args.min_delta_ms / 1000)
+        for regression in regressions:
+            label = "with mechanism" if regression["enable_mechanism"] else "without mechanism"
+            print(f"REGRESSION scale {regression['scale']} ({label}) {regression['phase']}: "
+                  f"{regression['baseline'] * 1000:.2f} ms -> {regression['current'] * 1000:.2f} ms ({regression['ratio']:.2f}x)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
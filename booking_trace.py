@@ -0,0 +1,124 @@
+import json
+
+import numpy as np
+
+#Event codes stored in the trace
+RUN_START = 0
+ROUND_START = 1
+SCHEDULE = 2
+BOOK = 3
+OVERBOOK = 4
+CANCEL = 5
+RESERVE = 6
+SHARE = 7
+STRATEGY = 8
+
+EVENT_NAMES = {
+    RUN_START: "run_start",
+    ROUND_START: "round_start",
+    SCHEDULE: "schedule",
+    BOOK: "book",
+    OVERBOOK: "overbook",
+    CANCEL: "cancel",
+    RESERVE: "reserve",
+    SHARE: "share",
+    STRATEGY: "strategy",
+}
+
+#One fixed-size record per event. org and venue are indices into the header's organization and venue lists
+#(-1 when not applicable) and slot is an index into the header's time slots. For RUN_START the venue column
+#holds the enable_mechanism flag of the run, and for STRATEGY the code (population.STRATEGIES) of the strategy
+#the organization books with that round.
+RECORD_DTYPE = np.dtype([
+    ("event", "u1"),
+    ("round", "u4"),
+    ("org", "i4"),
+    ("venue", "i4"),
+    ("slot", "i4"),
+], align=False)
+
+
+#Append-only binary recorder of every booking decision in a simulation.
+#Records are collected in a fixed-size NumPy buffer and appended to the file whenever it fills,
+#so memory stays bounded no matter how many periods are run. Names, popularity levels and time slots
+#go into a JSON header written next to the trace (<path>.json).
+class TraceRecorder:
+    def __init__(self, path, buffer_size=65536):
+        self.path = path
+        self.buffer = np.zeros(buffer_size, dtype=RECORD_DTYPE)
+        self.count = 0
+        self.round = 0
+        self.org_index = {}
+        self.venue_index = {}
+        self.slot_index = {}
+        self.file = open(path, "wb")
+
+    def bind(self, simulation):
+        venues = simulation.venues + simulation.reserve_venues
+        #organizations of an array population are views that carry their own index
+        self.org_index = {org: i for i, org in enumerate(simulation.organizations)} if simulation.population is None else None
+        self.venue_index = {venue: i for i, venue in enumerate(venues)}
+        self.slot_index = {slot: i for i, slot in enumerate(simulation.time_slots)}
+        header = {
+            "organizations": [org.name for org in simulation.organizations],
+            "venues": [venue.name for venue in venues],
+            "popularity": [venue.popularity_level for venue in venues],
+            "reserve": [venue in simulation.reserve_venues for venue in venues],
+            "time_slots": list(simulation.time_slots),
+            "dtype": RECORD_DTYPE.descr,
+            "events": EVENT_NAMES,
+        }
+        with open(self.path + ".json", "w") as header_file:
+            json.dump(header, header_file)
+
+    def org_position(self, org):
+        return org.index if self.org_index is None else self.org_index[org]
+
+    def record(self, event, org=None, venue=None, slot=None):
+        self.buffer[self.count] = (
+            event,
+            self.round,
+            -1 if org is None else self.org_position(org),
+            -1 if venue is None else self.venue_index[venue],
+            -1 if slot is None else self.slot_index[slot],
+        )
+        self.count += 1
+        if self.count == len(self.buffer):
+            self.flush()
+
+    def record_strategy(self, org, code):
+        self.buffer[self.count] = (STRATEGY, self.round, self.org_position(org), code, -1)
+        self.count += 1
+        if self.count == len(self.buffer):
+            self.flush()
+
+    def start_run(self, enable_mechanism):
+        self.round = 0
+        self.buffer[self.count] = (RUN_START, 0, -1, int(enable_mechanism), -1)
+        self.count += 1
+        if self.count == len(self.buffer):
+            self.flush()
+
+    def start_round(self, round_number):
+        self.round = round_number
+        self.record(ROUND_START)
+
+    def flush(self):
+        self.buffer[:self.count].tofile(self.file)
+        self.file.flush()
+        self.count = 0
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+def read_trace(path):
+    #memory-map the records so long traces can be sliced without loading them into RAM
+    with open(path + ".json") as header_file:
+        header = json.load(header_file)
+    header["events"] = {int(code): name for code, name in header["events"].items()}
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r")
+    return header, records
@@ -0,0 +1,191 @@
+import os
+import pickle
+import signal
+
+#Checkpoints of a running simulation, so a long run_simulations can be resumed after the process dies.
+#A checkpoint is two files:
+#  <path>          the live state (organizations, venues, free-venue index, occupancy grid, random streams, mechanism
+#                  flag, arm and round reached), pickled whole and atomically replaced on every save. Its size depends
+#                  on the number of organizations and venues, not on how many rounds have been played.
+#  <path>.history  an append-only journal of the history entries (scores, strategies, round scores, Nash results)
+#                  added since the previous save, so the growing histories are never rewritten, and of the results of
+#                  each arm, written once when the arm has finished.
+#The event log, trace recorder, profile, the histories and the finished arms' results are kept out of the state pickle;
+#on resume the caller's log and profile are attached instead and the rest is rebuilt from the journal. A resumed run is not traced:
+#the trace of the rounds before the checkpoint is not part of the state, and rescoring.py needs a run's whole trace.
+
+HISTORY_SUFFIX = ".history"
+
+
+class Checkpointer:
+    def __init__(self, path, interval=10):
+        self.path = path
+        self.history_path = path + HISTORY_SUFFIX
+        #save after every interval rounds (0 only saves at the end of each arm and on SIGTERM)
+        self.interval = interval
+        self.requested = False
+        #how much of each history is already in the journal: (arm, rounds, nash results), and the finished arms in it
+        self.saved = (None, 0, 0)
+        self.saved_arms = set()
+
+    def start(self, resumed=None):
+        #a fresh run starts a fresh journal; a resumed run keeps appending to the one it was loaded from
+        if resumed is None:
+            for path in (self.path, self.history_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        else:
+            self.saved = (resumed.arm, resumed.current_period, len(resumed.nash_results))
+            self.saved_arms = set(resumed.arm_results)
+
+    def install_signal_handler(self):
+        #SIGTERM only sets a flag; the simulation saves and exits once the round in progress is finished,
+        #since the state in the middle of a round cannot be resumed
+        signal.signal(signal.SIGTERM, self._terminate)
+
+    def _terminate(self, signum, frame):
+        self.requested = True
+
+    def round_finished(self, simulation):
+        if self.requested:
+            self.save(simulation)
+            raise SystemExit(128 + signal.SIGTERM)
+        if self.interval > 0 and simulation.current_period % self.interval == 0:
+            self.save(simulation)
+
+    def save(self, simulation):
+        #the bookings left from the last round link every organization and venue into one long chain that is too deep to pickle.
+        #They are cleared first thing next round anyway, so clear them now in that same order: the free-venue index ends up
+        #exactly as the next round's reset would leave it, and the rest of the run is unchanged.
+        for venue in simulation.venues + simulation.reserve_venues:
+            venue.reset_venue_bookings()
+        self._append_history(simulation)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as state_file:
+            _dump_state(simulation, state_file)
+        #the journal is written first and the state replaced last, so a crash mid-save leaves the previous checkpoint usable
+        os.replace(tmp_path, self.path)
+
+    def _append_history(self, simulation):
+        arm, rounds, nash = self.saved
+        if arm != simulation.arm or rounds > simulation.current_period:
+            rounds, nash = 0, 0
+        names = list(simulation.score_history)
+        record = {
+            "arm": simulation.arm,
+            "start": rounds,
+            "scores": [simulation.score_history[name][rounds:] for name in names],
+            "strategies": [simulation.strategy_history[name][rounds:] for name in names],
+            "round_scores": _round_scores(simulation, rounds),
+            "nash_start": nash,
+            "nash_results": simulation.nash_results[nash:],
+        }
+        with open(self.history_path, "ab") as history_file:
+            pickle.dump(record, history_file, protocol=pickle.HIGHEST_PROTOCOL)
+            for arm, results in simulation.arm_results.items():
+                if arm not in self.saved_arms:
+                    pickle.dump({"arm": arm, "results": results}, history_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.saved = (simulation.arm, simulation.current_period, len(simulation.nash_results))
+        self.saved_arms = set(simulation.arm_results)
+
+
+#attributes that are not part of the saved state: output objects and worker pools that belong to the invocation, and the histories
+#and finished arms' results kept in the journal
+SIMULATION_DETACHED = ("log", "trace", "profile", "checkpoint", "cube", "progress", "pools", "score_history", "strategy_history", "nash_results", "arm_results")
+ORGANIZATION_DETACHED = ("log", "trace", "profile", "round_scores")
+VENUE_DETACHED = ("log",)
+
+
+def _round_owners(simulation):
+    #an array population keeps one shared round_scores list (and log, trace and profile) for all its organizations
+    return [simulation.population] if simulation.population is not None else simulation.organizations
+
+
+def _round_scores(simulation, rounds):
+    return [owner.round_scores[rounds:] for owner in _round_owners(simulation)]
+
+
+def _detached(simulation):
+    return ([(simulation, SIMULATION_DETACHED)]
+            + [(owner, ORGANIZATION_DETACHED) for owner in _round_owners(simulation)]
+            + [(venue, VENUE_DETACHED) for venue in simulation.venues + simulation.reserve_venues])
+
+
+def _dump_state(simulation, state_file):
+    #the detached attributes are set to None for the length of the dump rather than filtered out object by object,
+    #which keeps the whole pickle in C
+    state = {"simulation": simulation, "nash_results": len(simulation.nash_results), "finished_arms": list(simulation.arm_results)}
+    saved = [(obj, [(name, getattr(obj, name)) for name in names]) for obj, names in _detached(simulation)]
+    try:
+        for obj, names in _detached(simulation):
+            for name in names:
+                setattr(obj, name, None)
+        pickle.dump(state, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for obj, values in saved:
+            for name, value in values:
+                setattr(obj, name, value)
+
+
+def _read_history(history_path, arm):
+    #journal records for this arm, with later records overriding any overlap left by a save that did not finish,
+    #and the results of every finished arm in the journal
+    histories = {"scores": [], "strategies": [], "round_scores": []}
+    nash_results = []
+    arm_results = {}
+    if not os.path.exists(history_path):
+        return histories, nash_results, arm_results
+    with open(history_path, "rb") as history_file:
+        while True:
+            try:
+                record = pickle.load(history_file)
+            except (EOFError, pickle.UnpicklingError):
+                #a record cut short by the process dying mid-append
+                break
+            if "results" in record:
+                arm_results[record["arm"]] = record["results"]
+                continue
+            if record["arm"] != arm:
+                continue
+            for key, entries in histories.items():
+                if not entries:
+                    entries.extend([] for _ in record[key])
+                for org_entries, delta in zip(entries, record[key]):
+                    del org_entries[record["start"]:]
+                    org_entries.extend(delta)
+            del nash_results[record["nash_start"]:]
+            nash_results.extend(record["nash_results"])
+    return histories, nash_results, arm_results
+
+
+def load_checkpoint(path, log, profile=None, checkpoint=None, cube=None):
+    #rebuild the simulation saved at path, attached to the given log, profile, checkpointer and cube writer
+    #(the saved run may have had different ones, or none)
+    with open(path, "rb") as state_file:
+        state = pickle.load(state_file)
+    simulation = state["simulation"]
+    simulation.log = log
+    simulation.trace = None
+    simulation.profile = profile
+    simulation.checkpoint = checkpoint
+    simulation.cube = cube
+    simulation.pools = {}
+    for venue in simulation.venues + simulation.reserve_venues:
+        venue.log = log
+
+    histories, nash_results, arm_results = _read_history(path + HISTORY_SUFFIX, simulation.arm)
+    #an arm whose results reached the journal but whose final save never replaced the state is still in progress
+    simulation.arm_results = {arm: arm_results[arm] for arm in state["finished_arms"]}
+    #journal entries past the saved round belong to a record whose state was never written
+    rounds = simulation.current_period
+    simulation.attach(log=log, trace=None, profile=profile)
+    for index, owner in enumerate(_round_owners(simulation)):
+        owner.round_scores = histories["round_scores"][index][:rounds] if histories["round_scores"] else []
+    names = [org.name for org in simulation.organizations] if simulation.keep_history else []
+    simulation.score_history = {name: histories["scores"][index][:rounds] if histories["scores"] else [] for index, name in enumerate(names)}
+    simulation.strategy_history = {name: histories["strategies"][index][:rounds] if histories["strategies"] else [] for index, name in enumerate(names)}
+    simulation.nash_results = nash_results[:state["nash_results"]]
+
+    if checkpoint is not None:
+        checkpoint.start(simulation)
+    return simulation
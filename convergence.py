@@ -0,0 +1,40 @@
+import numpy as np
+
+from organization import Organization
+from population import STRATEGY_CODES
+
+#Stopping rule for a run: the run has settled once, for `window` rounds in a row, both
+#  - the strategy profile (share of organizations overbooking after update_strategies) and
+#  - the reputation distribution after update_reputations (mean absolute difference of the sorted reputations, the
+#    distance between the two rounds' distributions, as a share of the reputation range)
+#moved by at most `tolerance` from the round before. Organizations may still trade places within the distribution.
+class ConvergenceMonitor:
+    def __init__(self, tolerance, window=5):
+        if tolerance < 0:
+            raise ValueError(f"Convergence tolerance must not be negative, got {tolerance}")
+        if window < 1:
+            raise ValueError(f"Convergence window must be at least one round, got {window}")
+        self.tolerance = tolerance
+        self.window = window
+        self.overbook_share = None
+        self.reputations = None
+        self.strategy_shift = None
+        self.reputation_shift = None
+        #consecutive rounds both shifts have stayed within the tolerance
+        self.stable_rounds = 0
+
+    def observe(self, strategies, reputations):
+        #strategies are the strategy codes and reputations the reputations after this round's updates;
+        #returns whether the run has now been stationary for the whole window
+        overbook_share = float(np.mean(np.asarray(strategies) == STRATEGY_CODES["overbook"]))
+        reputations = np.sort(np.asarray(reputations, dtype=float))
+        if self.reputations is not None:
+            self.strategy_shift = abs(overbook_share - self.overbook_share)
+            self.reputation_shift = float(np.abs(reputations - self.reputations).mean()) / (Organization.MAX_REPUTATION - Organization.MIN_REPUTATION)
+            if self.strategy_shift <= self.tolerance and self.reputation_shift <= self.tolerance:
+                self.stable_rounds += 1
+            else:
+                self.stable_rounds = 0
+        self.overbook_share = overbook_share
+        self.reputations = reputations
+        return self.stable_rounds >= self.window
@@ -0,0 +1,64 @@
+import json
+import sys
+
+#Verbosity levels for simulation events, from least to most detailed.
+#SUMMARY covers final results, ROUND covers round headers and per-round aggregates,
+#and BOOKING covers every per-organization and per-booking event.
+OFF = 0
+SUMMARY = 1
+ROUND = 2
+BOOKING = 3
+
+LEVELS = {"off": OFF, "summary": SUMMARY, "round": ROUND, "booking": BOOKING}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+
+#Structured, leveled sink for simulation events.
+#Messages are templates that are only formatted when their level is enabled, so disabled events cost one comparison.
+#Enabled events are written as text to a stream and, optionally, as JSON lines to a file.
+class EventLog:
+    def __init__(self, level=BOOKING, stream=None, json_path=None, text=True):
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        self.stream = stream if stream is not None else sys.stdout
+        self.text = text
+        self.json_file = open(json_path, "w") if json_path else None
+        #current round number, attached to JSON events; set by the simulation
+        self.round = None
+
+    #streams and open files cannot be pickled, so a log sent to another process writes text to that process's stdout
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["stream"] = None
+        state["json_file"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.stream = sys.stdout
+
+    def enabled(self, level):
+        return level <= self.level
+
+    def emit(self, level, event, message, **fields):
+        if level > self.level:
+            return
+        if self.text:
+            self.stream.write(message.format(**fields) + "\n")
+        if self.json_file is not None:
+            record = {"round": self.round, "level": LEVEL_NAMES[level], "event": event}
+            record.update(fields)
+            self.json_file.write(json.dumps(record, default=_json_default) + "\n")
+
+    def close(self):
+        if self.json_file is not None:
+            self.json_file.close()
+            self.json_file = None
+
+
+def _json_default(value):
+    #schedules are sets and NumPy scalars show up in fields; anything else falls back to its string form
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
@@ -1,5 +1,14 @@
 import argparse
+import json
 from simulation import Simulation
+from replication import run_replicates, run_replicates_until, aggregate, print_summary, report_runs
+from events import EventLog, LEVELS
+from booking_trace import TraceRecorder
+from timegrid import Calendar
+from checkpoint import Checkpointer, load_checkpoint
+from profiling import RunProfile
+from reporting import render_report
+import os
 
 def main():
     parser = argparse.ArgumentParser(description="Run the organization booking simulation.")
@@ -8,12 +17,95 @@ def main():
     parser.add_argument('--num_periods', type=int, default=10, help='Number of periods')
     parser.add_argument('--cancellation_rate', type=float, default=0.3, help='Cancellation rate')
     parser.add_argument('--venue-sharing', action='store_true', default=False, help='Enable venue sharing')
+    parser.add_argument('--sharing-capacity', type=int, default=None, help='Most organizations that can share one venue in a time slot under the mechanism (default: no limit)')
+    parser.add_argument('--days', type=int, default=1, help='Number of days in the booking calendar')
+    parser.add_argument('--hours', type=int, nargs=2, default=[8, 24], metavar=('START', 'END'), help='Daily hours covered by the calendar')
+    parser.add_argument('--slot-minutes', type=int, default=60, help='Length of a time slot in minutes (must divide an hour)')
+    parser.add_argument('--venue-hours', choices=Simulation.VENUE_HOURS, default='calendar', help='Open every venue for the whole calendar day, or give each venue its own opening hours')
+    parser.add_argument('--engine', choices=Simulation.ENGINES, default='objects', help='Venue occupancy engine')
+    parser.add_argument('--population', choices=Simulation.POPULATIONS, default='objects', help='Organization state storage')
+    parser.add_argument('--allocation', choices=Simulation.ALLOCATIONS, default='sequential', help='How bookings are made: each organization in turn, or by clearing each time slot in one batch')
+    parser.add_argument('--allocation-workers', type=int, default=1, help='Worker processes clearing time slots with --allocation batch')
+    parser.add_argument('--nash-interval', type=int, default=None, help='Check for a Nash equilibrium every k rounds (0 disables; default 1, or 0 with --replicates)')
+    parser.add_argument('--nash-workers', type=int, default=1, help='Worker processes for the Nash deviation replays')
+
+    parser.add_argument('--stop-tolerance', type=float, default=None, help='Stop a run early once its strategy profile and reputations are stationary within this tolerance')
+    parser.add_argument('--stop-window', type=int, default=5, help='Rounds a run must stay stationary before --stop-tolerance stops it')
+
+    parser.add_argument('--replicates', type=int, default=0, help='Run this many independently seeded replicates of both arms and report confidence intervals')
+    parser.add_argument('--target-ci-width', type=float, default=None, help='Stop adding replicates once the 95%% CI on the average score difference is at most this wide (--replicates is then the maximum)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for replicates (default: all cores)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for a reproducible run (replicate seeds are spawned from it)')
+
+    parser.add_argument('--log-level', choices=list(LEVELS), default='booking', help='Most detailed event level to output')
+    parser.add_argument('--quiet', action='store_true', default=False, help='Only output final results (same as --log-level summary)')
+    parser.add_argument('--events-json', default=None, help='Also write enabled events to this file as JSON lines')
+    parser.add_argument('--trace', default=None, help='Record every booking decision to this binary trace file')
+    parser.add_argument('--report-dir', default='reports', help='Directory the plots and the combined PDF report are written to')
+    parser.add_argument('--no-plots', action='store_true', default=False, help='Skip rendering plots')
+    parser.add_argument('--profile', default=None, help='Time each phase, count booking activity and write the report for both runs to this JSON file')
+    parser.add_argument('--no-history', action='store_true', default=False, help='Keep only running strategy statistics instead of per-round score and strategy histories')
+    parser.add_argument('--checkpoint', default=None, help='Save the run state to this file every --checkpoint-interval rounds and on SIGTERM')
+    parser.add_argument('--checkpoint-interval', type=int, default=10, help='Rounds between checkpoints (0 saves only at the end of each arm and on SIGTERM)')
+    parser.add_argument('--resume', action='store_true', default=False, help='Continue the run saved in --checkpoint instead of starting a new one')
 
     args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error('--resume needs --checkpoint')
+    if args.resume and args.trace:
+        #the rounds before the checkpoint would be missing, and rescoring replays a trace from the first round
+        parser.error('--trace cannot be combined with --resume; record the trace in an uninterrupted run')
+    if args.replicates > 0:
+        #replicates run in worker processes with their event logs off and only report the aggregate summary,
+        #so the options for a single run's state, log and recordings have nothing to apply to
+        single_run_options = (('--checkpoint', args.checkpoint), ('--resume', args.resume), ('--trace', args.trace), ('--profile', args.profile),
+                              ('--events-json', args.events_json), ('--log-level', args.log_level != parser.get_default('log_level')), ('--quiet', args.quiet))
+        for option, given in single_run_options:
+            if given:
+                parser.error(f'{option} cannot be combined with --replicates; it only applies to a single run')
+    if args.nash_interval is None:
+        #the check replays a round per organization, which only the interactive single run can afford by default
+        args.nash_interval = 0 if args.replicates > 0 else 1
+
+    calendar = Calendar(days=args.days, start_hour=args.hours[0], end_hour=args.hours[1], slot_minutes=args.slot_minutes)
+    params = dict(calendar=calendar, venue_hours=args.venue_hours, num_orgs=args.num_orgs, num_venues=args.num_venues, num_periods=args.num_periods, cancellation_rate=args.cancellation_rate, enable_mechanism=args.venue_sharing, sharing_capacity=args.sharing_capacity, engine=args.engine, population=args.population, allocation=args.allocation, allocation_workers=args.allocation_workers, keep_history=not args.no_history, nash_interval=args.nash_interval, nash_workers=args.nash_workers, stop_tolerance=args.stop_tolerance, stop_window=args.stop_window)
+
+    if args.replicates > 0:
+        if args.target_ci_width is not None:
+            replicates, stop = run_replicates_until(params, args.target_ci_width, args.replicates, workers=args.workers, seed=args.seed, report=not args.no_plots)
+        else:
+            replicates, stop = run_replicates(params, args.replicates, workers=args.workers, seed=args.seed, report=not args.no_plots), None
+        print_summary(aggregate(replicates), stop)
+        if not args.no_plots:
+            print(f"Report written to {render_report(report_runs(replicates), os.path.join(args.report_dir, 'replicates.pdf'))}")
+        return
 
-    sim = Simulation(num_orgs=args.num_orgs, num_venues=args.num_venues, num_periods=args.num_periods, cancellation_rate=args.cancellation_rate, enable_mechanism=args.venue_sharing)
+    log = EventLog('summary' if args.quiet else args.log_level, json_path=args.events_json)
+    trace = TraceRecorder(args.trace) if args.trace else None
+    checkpoint = Checkpointer(args.checkpoint, args.checkpoint_interval) if args.checkpoint else None
+    report_dir = None if args.no_plots else args.report_dir
+    if args.resume:
+        #the simulation parameters come from the checkpoint; the output options are taken from this invocation
+        sim = load_checkpoint(args.checkpoint, log, profile=RunProfile() if args.profile else None, checkpoint=checkpoint)
+        sim.report_dir = report_dir
+    else:
+        sim = Simulation(**params, seed=args.seed, log=log, trace=trace, profile=args.profile is not None, report_dir=report_dir, checkpoint=checkpoint)
+    if checkpoint is not None:
+        checkpoint.install_signal_handler()
 
-    sim.run_simulations()
+    try:
+        results_without, results_with = sim.run_simulations()
+    finally:
+        log.close()
+        if trace is not None:
+            trace.close()
+    #an arm finished before resuming only has a report or profile if the first invocation produced one
+    reports = [results['report'] for results in (results_without, results_with) if 'report' in results]
+    if reports and not args.no_plots:
+        render_report(reports, os.path.join(args.report_dir, 'report.pdf'))
+    if args.profile:
+        with open(args.profile, "w") as profile_file:
+            json.dump({"without": results_without.get('profile'), "with": results_with.get('profile')}, profile_file, indent=2)
 
     # sim.run()
     # sim.print_results()
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+
+#Per-round, per-organization results of a whole sweep in one memory-mapped array of fixed-size records, shaped
+#scenarios x replicates x arms x rounds x organizations. Each record holds an organization's state at the end of a
+#round: cumulative score and booking totals, reputation and budget, and the strategy code (population.STRATEGIES) it
+#played the round with. Records of rounds a run never played (it stopped early or has fewer periods than the cube has
+#rounds) and of organizations a scenario does not have keep played = 0.
+#The scenarios, seeds and arms go into a JSON header next to the cube (<path>.json), as for booking traces.
+#Workers open the cube themselves and write their own replicate's records in place, so results never travel back
+#through pickling; readers slice it without loading the rest of the file.
+RECORD_DTYPE = np.dtype([
+    ("score", "f8"),
+    ("reputation", "f8"),
+    ("budget", "i8"),
+    ("strategy", "i1"),
+    ("successful_bookings", "i4"),
+    ("unused_bookings", "i4"),
+    ("played", "u1"),
+], align=False)
+
+ARMS = ("without", "with")
+
+
+def create_cube(path, scenarios, seeds, num_rounds, num_orgs):
+    #allocates the cube for every scenario and replicate seed; the file starts zero-filled (sparse where the OS allows)
+    shape = (len(scenarios), len(seeds), len(ARMS), num_rounds, num_orgs)
+    header = {
+        "shape": shape,
+        "scenarios": scenarios,
+        "seeds": seeds,
+        "arms": ARMS,
+        "dtype": RECORD_DTYPE.descr,
+    }
+    with open(path + ".json", "w") as header_file:
+        json.dump(header, header_file)
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="w+", shape=shape)
+    records.flush()
+    return header, records
+
+
+def open_cube(path, mode="r"):
+    #mode "r" for analysis, "r+" for writers
+    with open(path + ".json") as header_file:
+        header = json.load(header_file)
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode=mode, shape=tuple(header["shape"]))
+    return header, records
+
+
+def final_state(records):
+    #each run's record from its last played round, for any sub-cube whose last two axes are rounds x organizations
+    played = records["played"].sum(axis=-2)
+    last = np.maximum(played - 1, 0)
+    return np.take_along_axis(records, last[..., None, :], axis=-2)[..., 0, :]
+
+
+#Writes one replicate's rounds into the cube; the simulation calls record_round at the end of every round
+class CubeWriter:
+    def __init__(self, path, scenario, replicate):
+        self.path = path
+        self.scenario = scenario
+        self.replicate = replicate
+        _, cube = open_cube(path, "r+")
+        #arms x rounds x organizations of this replicate
+        self.records = cube[scenario, replicate]
+
+    def record_round(self, arm, round_index, state):
+        #state maps record fields to one value per organization (see Simulation.organization_state)
+        row = self.records[arm, round_index, :len(state["score"])]
+        for field, values in state.items():
+            row[field] = values
+        row["played"] = 1
+
+    def close(self):
+        self.records.flush()
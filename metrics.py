@@ -0,0 +1,55 @@
+import numpy as np
+
+#Fairness and utilization metrics over the last axis of an array of organization values, so one call covers a single
+#run (orgs), every replicate of a batch (replicates x orgs) or every round of a run (rounds x orgs).
+#Each returns one value per row (a scalar for a 1-D input).
+
+METRICS = ("gini", "jain", "theil")
+
+
+def _rows(values):
+    return np.asarray(values, dtype=float)
+
+
+def gini(values):
+    #0 for perfect equality, approaching 1 as one organization takes everything; all-zero rows are perfectly equal
+    values = np.sort(_rows(values), axis=-1)
+    n = values.shape[-1]
+    total = values.sum(axis=-1)
+    index = np.arange(1, n + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = (2 * (index * values).sum(axis=-1)) / (n * total) - (n + 1) / n
+    return np.where(np.all(values == 0, axis=-1), 0.0, result)
+
+
+def jain(values):
+    #Jain's fairness index: 1 when every organization gets the same, 1/n when one gets everything
+    values = _rows(values)
+    n = values.shape[-1]
+    squares = (values ** 2).sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = values.sum(axis=-1) ** 2 / (n * squares)
+    return np.where(squares == 0, 1.0, result)
+
+
+def theil(values):
+    #Theil T index: 0 for perfect equality, up to ln(n); defined for non-negative values, with 0 * ln(0) taken as 0
+    values = _rows(values)
+    mean = values.mean(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = values / mean
+        terms = np.where(share > 0, share * np.log(share), 0.0)
+    return np.where(mean[..., 0] == 0, 0.0, terms.mean(axis=-1))
+
+
+def fairness(values):
+    #all the fairness metrics for the same rows at once
+    return {"gini": gini(values), "jain": jain(values), "theil": theil(values)}
+
+
+def utilization(successful, unused):
+    #successful bookings as a share of successful plus unused bookings (as tallied when scoring), per row; 0 when both are 0
+    successful = _rows(successful).sum(axis=-1)
+    total = successful + _rows(unused).sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total == 0, 0.0, successful / total)
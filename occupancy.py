@@ -0,0 +1,33 @@
+import numpy as np
+
+from organization import Organization
+
+#Array-backed record of venue occupancy used by the "array" engine.
+#Each row is a venue and each column is a time slot; the value is the number of organizations booked into that cell.
+#Venues report their bookings and cancellations here, so the grid always mirrors Venue.time_slots.
+class OccupancyGrid:
+    def __init__(self, venues, time_slots):
+        self.venues = list(venues)
+        self.time_slots = list(time_slots)
+        self.slot_index = {slot: col for col, slot in enumerate(self.time_slots)}
+        self.rows = {venue: row for row, venue in enumerate(self.venues)}
+
+        self.occupancy = np.zeros((len(self.venues), len(self.time_slots)), dtype=np.int32)
+        #popularity and booking cost per venue, in the same row order as the occupancy matrix
+        self.popularity = np.array([venue.popularity_level for venue in self.venues], dtype=np.int32)
+        self.cost = self.popularity * Organization.COST_PER_LEVEL
+
+        for venue in self.venues:
+            venue.attach(self)
+
+    def booked(self, venue, slot):
+        self.occupancy[self.rows[venue], self.slot_index[slot]] += 1
+
+    def cleared(self, venue, slot):
+        self.occupancy[self.rows[venue], self.slot_index[slot]] = 0
+
+    #draw one Bernoulli trial per booked cell in a single pass and return the (venue, slot) pairs to cancel
+    def cancellation_draws(self, cancellation_rate, generator):
+        mask = (self.occupancy > 0) & (generator.random(self.occupancy.shape) < cancellation_rate)
+        rows, cols = np.nonzero(mask)
+        return [(self.venues[row], self.time_slots[col]) for row, col in zip(rows, cols)]
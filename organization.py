@@ -1,9 +1,29 @@
-import random
+from rng import SimulationRNG
+from events import EventLog, BOOKING
+from booking_trace import BOOK, OVERBOOK
 
 #Class instance for the organization with a score, reputation, and strategy
 class Organization:
-    def __init__(self, name, events, schedule):
+    # Constants for reward and penalty
+    REWARD_MULTIPLIER = 5  # Increased to boost rewards
+    PENALTY_STEP = 0.5  # added to the penalty cost for every unused booking
+    PENALTY_CAP = 10  # highest penalty cost per unused booking
+    COST_PER_LEVEL = 5  # booking cost per popularity level, paid when booking and earned back by a utilized venue
+
+    # Constants for reputation and strategy updates
+    REPUTATION_SCALE = 0.5  # reputation change per point of score above or below average
+    MAX_REPUTATION_CHANGE = 20  # Maximum reputation change per round
+    MIN_REPUTATION = 0
+    MAX_REPUTATION = 200
+    LOW_BUDGET = 10  # below this budget an organization stops overbooking
+    LOW_REPUTATION = 60  # below this reputation a below-average organization stops overbooking
+
+    def __init__(self, name, events, schedule, rng=None, log=None):
         self.name = name
+        #random streams shared with the simulation; an unseeded set is created for standalone organizations
+        self.rng = rng if rng is not None else SimulationRNG()
+        #event log shared with the simulation
+        self.log = log if log is not None else EventLog()
         #Number of events/time slots that the organization wants to book
         self.num_events = events
         #value used each round to determine if the organization is doing well or not which is calculated by how well they utilized their rooms and if they get penalized by overbooking
@@ -11,7 +31,9 @@ class Organization:
         #reputation of the organization that they must maintain if they want to continue booking venues
         self.reputation = 100
         #which strategy the organization uses to book venues
-        self.strategy = random.choice(["overbook", "normal"])
+        self.strategy = self.rng.setup.choice(["overbook", "normal"])
+        #strategy restored when the simulation is reset so every run starts from the same profile
+        self.initial_strategy = self.strategy
         # as organizations overbook and are penalized, the penalty cost will increase
         self.penalty_cost = 1
         #budget of the organization
@@ -24,86 +46,150 @@ class Organization:
 
         self.current_round_score = 0
 
-    def book_venues(self, venues, enable_mechanism=False):
-        if self.budget <= 5:
-            print(f"{self.name} has insufficient budget to book any venue.")
+        #booking ledger mapping each time slot to the venues this organization holds for it
+        #kept in sync by Venue.book, Venue.cancel_booking and Venue.reset_venue_bookings
+        self.bookings = {}
+
+        #TraceRecorder the simulation attaches when it records booking decisions
+        self.trace = None
+        #RunProfile the simulation attaches when it counts booking activity
+        self.profile = None
+
+    #index is the simulation's FreeVenueIndex, which picks an available venue per slot directly;
+    #without one the venues are filtered for availability one by one.
+    #The attributes read for every booking are looked up once, and the budget is written back once at the end,
+    #which keeps organizations whose state lives in a Population (population.OrganizationView) as quick to book as plain ones.
+    def book_venues(self, venues, enable_mechanism=False, index=None):
+        log, profile, trace, name = self.log, self.profile, self.trace, self.name
+        budget = self.budget
+        if budget <= 5:
+            log.emit(BOOKING, "insufficient_budget", "{org} has insufficient budget to book any venue.", org=name)
+            if profile is not None:
+                profile.count("budget_rejections", len(self.schedule))
             return False
 
+        venue_choice = self.rng.venue_choice
+        overbook = self.strategy == "overbook"
         for time_slot in self.schedule:
-            # Filter venues with the desired time slot available
-            available_venues = [venue for venue in venues if venue.is_available(time_slot, enable_mechanism)]
-            if not available_venues:
-                print(f"{self.name} could not find any available venues for time slot {time_slot}.")
+            # Pick a random venue with the desired time slot available
+            if index is not None:
+                venue = index.choose(time_slot, venue_choice, enable_mechanism)
+            else:
+                available_venues = [venue for venue in venues if venue.is_available(time_slot, enable_mechanism)]
+                venue = venue_choice.choice(available_venues) if available_venues else None
+            if venue is None:
+                log.emit(BOOKING, "no_venue", "{org} could not find any available venues for time slot {slot}.", org=name, slot=time_slot)
                 continue
 
-            venue = random.choice(available_venues)
-            cost = venue.popularity_level * 5
+            cost = venue.popularity_level * self.COST_PER_LEVEL
+            if profile is not None:
+                profile.count("bookings_attempted")
 
-            if self.budget >= cost:
-                self.budget -= cost
+            if budget >= cost:
+                budget -= cost
                 if venue.book(self, time_slot, enable_mechanism=enable_mechanism):
-                    print(f"{self.name} successfully booked {venue.name} at time slot {time_slot}.")
+                    if profile is not None:
+                        profile.count("bookings_succeeded")
+                    log.emit(BOOKING, "booked", "{org} successfully booked {venue} at time slot {slot}.", org=name, venue=venue.name, slot=time_slot)
+                    if trace is not None:
+                        trace.record(BOOK, self, venue, time_slot)
 
                     # If overbooking, attempt to book an additional venue for the same time slot
-                    if self.strategy == "overbook" and self.budget >= cost:
-                        additional_venues = [v for v in available_venues if v != venue]
-                        if additional_venues:
-                            additional_venue = random.choice(additional_venues)
-                            additional_cost = additional_venue.popularity_level * 5
-                            if self.budget >= additional_cost:
-                                self.budget -= additional_cost
+                    if overbook and budget >= cost:
+                        if index is not None:
+                            additional_venue = index.choose(time_slot, venue_choice, enable_mechanism, exclude=venue)
+                        else:
+                            additional_venues = [v for v in available_venues if v != venue]
+                            additional_venue = venue_choice.choice(additional_venues) if additional_venues else None
+                        if additional_venue is not None:
+                            additional_cost = additional_venue.popularity_level * self.COST_PER_LEVEL
+                            if profile is not None:
+                                profile.count("bookings_attempted")
+                            if budget >= additional_cost:
+                                budget -= additional_cost
                                 if additional_venue.book(self, time_slot, enable_mechanism=enable_mechanism):
-                                    print(f"{self.name} also overbooked {additional_venue.name} at time slot {time_slot}.")
+                                    log.emit(BOOKING, "overbooked", "{org} also overbooked {venue} at time slot {slot}.", org=name, venue=additional_venue.name, slot=time_slot)
+                                    if trace is not None:
+                                        trace.record(OVERBOOK, self, additional_venue, time_slot)
+                                    if profile is not None:
+                                        profile.count("overbookings")
+                            elif profile is not None:
+                                profile.count("budget_rejections")
             else:
-                print(f"{self.name} does not have enough budget to book {venue.name}.")
+                log.emit(BOOKING, "budget_rejected", "{org} does not have enough budget to book {venue}.", org=name, venue=venue.name)
+                if profile is not None:
+                    profile.count("budget_rejections")
                 continue
 
+        self.budget = budget
         return True
 
+    #books a venue assigned by the batch allocator (see allocation.py), which has already checked it is free and affordable
+    def book_allocated(self, venue, time_slot, enable_mechanism=False, overbooked=False):
+        self.budget -= venue.popularity_level * self.COST_PER_LEVEL
+        venue.book(self, time_slot, enable_mechanism=enable_mechanism)
+        if self.profile is not None:
+            self.profile.count("bookings_attempted")
+            self.profile.count("overbookings" if overbooked else "bookings_succeeded")
+        if overbooked:
+            self.log.emit(BOOKING, "overbooked", "{org} also overbooked {venue} at time slot {slot}.", org=self.name, venue=venue.name, slot=time_slot)
+        else:
+            self.log.emit(BOOKING, "booked", "{org} successfully booked {venue} at time slot {slot}.", org=self.name, venue=venue.name, slot=time_slot)
+        if self.trace is not None:
+            self.trace.record(OVERBOOK if overbooked else BOOK, self, venue, time_slot)
+
+    def add_booking(self, venue, slot):
+        self.bookings.setdefault(slot, []).append(venue)
+
+    def remove_booking(self, venue, slot):
+        venues_booked = self.bookings.get(slot)
+        if venues_booked and venue in venues_booked:
+            venues_booked.remove(venue)
+            if not venues_booked:
+                del self.bookings[slot]
+
     def update_strategy(self, avg_round_score):
-        if self.budget < 10:
+        if self.budget < self.LOW_BUDGET:
             self.strategy = "normal"
-            print(f"{self.name} has switched to normal strategy due to low budget.")
-        elif self.reputation < 60 and self.current_round_score < avg_round_score:
+            self.log.emit(BOOKING, "strategy", "{org} has switched to normal strategy due to low budget.", org=self.name, strategy=self.strategy, reason="low_budget")
+        elif self.reputation < self.LOW_REPUTATION and self.current_round_score < avg_round_score:
             self.strategy = "normal"
-            print(f"{self.name} has switched to normal strategy due to low score and reputation.")
-        elif self.current_round_score > avg_round_score and self.reputation >= 60:
+            self.log.emit(BOOKING, "strategy", "{org} has switched to normal strategy due to low score and reputation.", org=self.name, strategy=self.strategy, reason="low_score_reputation")
+        elif self.current_round_score > avg_round_score and self.reputation >= self.LOW_REPUTATION:
             self.strategy = "overbook"
-            print(f"{self.name} has switched to overbook strategy due to high score and reputation.")
+            self.log.emit(BOOKING, "strategy", "{org} has switched to overbook strategy due to high score and reputation.", org=self.name, strategy=self.strategy, reason="high_score_reputation")
         else:
-            self.strategy = random.choice(["overbook", "normal"])
-            print(f"{self.name} has randomly switched strategies due to average performance.")
+            self.strategy = self.rng.strategy.choice(["overbook", "normal"])
+            self.log.emit(BOOKING, "strategy", "{org} has randomly switched strategies due to average performance.", org=self.name, strategy=self.strategy, reason="random")
         return True
 
 
     def update_reputation(self, avg_round_score):
         score_diff = self.current_round_score - avg_round_score
         # Adjust reputation change rate as needed
-        reputation_change = score_diff * 0.5  # 0.5 is a scaling factor
-        max_change = 20  # Maximum reputation change per round
+        reputation_change = score_diff * self.REPUTATION_SCALE
+        max_change = self.MAX_REPUTATION_CHANGE
         
         # Ensure the reputation change doesn't exceed the maximum allowed change
         reputation_change = max(-max_change, min(max_change, reputation_change))
         
         self.reputation += reputation_change
         if reputation_change > 0:
-            print(f"{self.name} has gained {reputation_change:.2f} reputation due to high score.")
+            self.log.emit(BOOKING, "reputation", "{org} has gained {change:.2f} reputation due to high score.", org=self.name, change=reputation_change)
         elif reputation_change < 0:
-            print(f"{self.name} has lost {abs(reputation_change):.2f} reputation due to low score.")
+            self.log.emit(BOOKING, "reputation", "{org} has lost {loss:.2f} reputation due to low score.", org=self.name, change=reputation_change, loss=-reputation_change)
         else:
-            print(f"{self.name}'s reputation remains the same.")
+            self.log.emit(BOOKING, "reputation", "{org}'s reputation remains the same.", org=self.name, change=reputation_change)
         
-        self.reputation = max(0, min(200, self.reputation))
+        self.reputation = max(self.MIN_REPUTATION, min(self.MAX_REPUTATION, self.reputation))
         return True
 
 
     def calculate_payoff(self, successful_bookings, unused_bookings):
-        # Constants for reward and penalty
-        REWARD_MULTIPLIER = 5  # Increased to boost rewards
-        PENALTY_PER_UNUSED = self.penalty_cost   # Reduced to lower penalties
+        PENALTY_PER_UNUSED = self.penalty_cost
 
         # Total reward is based on the sum of venue popularity levels
-        total_reward = sum([venue.popularity_level * REWARD_MULTIPLIER for venue, _ in successful_bookings])
+        total_reward = sum([venue.popularity_level * self.REWARD_MULTIPLIER for venue, _ in successful_bookings])
 
         # Total penalty is based on unused bookings
         total_penalty = unused_bookings * PENALTY_PER_UNUSED
@@ -115,7 +201,7 @@ class Organization:
 
 
     def update_penalty(self, unused_venues):
-        self.penalty_cost += unused_venues * 0.5
-        self.penalty_cost = min(10, self.penalty_cost)
-        print(f"{self.name} has a penalty cost of {self.penalty_cost} due to {unused_venues} unused venues.")
+        self.penalty_cost += unused_venues * self.PENALTY_STEP
+        self.penalty_cost = min(self.PENALTY_CAP, self.penalty_cost)
+        self.log.emit(BOOKING, "penalty", "{org} has a penalty cost of {penalty_cost} due to {unused} unused venues.", org=self.name, penalty_cost=self.penalty_cost, unused=unused_venues)
         return True
\ No newline at end of file
@@ -0,0 +1,238 @@
+import operator
+
+import numpy as np
+
+from organization import Organization
+
+#strategy codes used in the strategy array
+STRATEGIES = ("normal", "overbook")
+NORMAL = 0
+OVERBOOK = 1
+STRATEGY_CODES = {name: code for code, name in enumerate(STRATEGIES)}
+
+#most venues one organization holds for a single event: its booking and, when overbooking, one more
+MAX_HELD = 2
+
+
+#Struct-of-arrays store for every organization, keyed by organization index.
+#The numeric state (score, reputation, budget, penalty, strategy, booking totals) is one array per field, and the
+#end-of-round rules from Organization (penalty cap, payoff, reputation clamp and strategy switch) are applied to the
+#whole population at once as NumPy operations. Schedules are kept in CSR layout: organization i's events are
+#schedule_slots[schedule_offsets[i]:schedule_offsets[i + 1]], in chronological order. The booking ledger holds, per
+#event, the positions (in venues) of the venues booked for it, or -1. The random streams, event log, trace and
+#profile are shared by the whole population rather than referenced from every organization.
+class Population:
+    def __init__(self, num_events, initial_strategy, venues, rng, log):
+        self.size = len(num_events)
+        self.num_events = np.asarray(num_events, dtype=np.int64)
+        #strategy codes restored when the simulation is reset so every run starts from the same profile
+        self.initial_strategy = np.asarray(initial_strategy, dtype=np.int8)
+        self.rng = rng
+        self.log = log
+        self.trace = None
+        self.profile = None
+        #every venue an organization can hold (the simulation's venues and reserve venues) and their popularity levels
+        self.venues = venues
+        self.venue_position = {venue: i for i, venue in enumerate(venues)}
+        self.venue_popularity = np.array([venue.popularity_level for venue in venues], dtype=np.int64)
+        self.set_schedules(np.zeros(self.size + 1, dtype=np.int64), np.zeros(0))
+        self.reset()
+
+    def reset(self):
+        size = self.size
+        self.score = np.zeros(size)
+        self.current_round_score = np.zeros(size)
+        self.reputation = np.full(size, 100.0)
+        self.budget = np.full(size, 200, dtype=np.int64)
+        self.penalty_cost = np.ones(size)
+        self.strategy = self.initial_strategy.copy()
+        self.total_successful_bookings = np.zeros(size, dtype=np.int64)
+        self.total_unused_bookings = np.zeros(size, dtype=np.int64)
+        #(strategy codes, payoffs) of every round played, when the simulation keeps its histories
+        self.round_scores = []
+
+    def set_schedules(self, offsets, slots):
+        #the round's schedules, with an empty ledger; bookings left on the venues from the previous schedules
+        #are cleared afterwards (see remove_booking)
+        self.schedule_offsets = offsets
+        self.schedule_slots = slots
+        #organization owning each event
+        self.event_org = np.repeat(np.arange(self.size), np.diff(offsets))
+        self.held = np.full((len(slots), MAX_HELD), -1, dtype=np.int32)
+
+    def schedule(self, index):
+        return self.schedule_slots[self.schedule_offsets.item(index):self.schedule_offsets.item(index + 1)].tolist()
+
+    def event(self, index, slot):
+        #ledger row of organization index's event at slot, or None if it has no event there.
+        #Schedules are a few events long, so the lookup runs on plain Python values rather than through NumPy calls.
+        start = self.schedule_offsets.item(index)
+        schedule = self.schedule_slots[start:self.schedule_offsets.item(index + 1)].tolist()
+        return start + schedule.index(slot) if slot in schedule else None
+
+    def add_booking(self, index, venue, slot):
+        event = self.event(index, slot)
+        self.held[event, 0 if self.held.item(event, 0) < 0 else 1] = self.venue_position[venue]
+
+    def remove_booking(self, index, venue, slot):
+        #a slot that is not in the schedule any more belongs to the previous round's schedule and has nothing in the ledger
+        event = self.event(index, slot)
+        if event is None:
+            return
+        held = self.held
+        position = self.venue_position[venue]
+        if held.item(event, 0) == position:
+            held[event] = held.item(event, 1), -1
+        elif held.item(event, 1) == position:
+            held[event, 1] = -1
+
+    def bookings(self, index):
+        #the ledger of one organization as Organization.bookings: time slot -> venues held for it
+        start, end = self.schedule_offsets.item(index), self.schedule_offsets.item(index + 1)
+        return {slot: [self.venues[position] for position in held if position >= 0]
+                for slot, held in zip(self.schedule_slots[start:end].tolist(), self.held[start:end].tolist()) if held[0] >= 0}
+
+    def unbooked(self, order):
+        #events without any venue, for the organizations in order and each organization's events in schedule order
+        rank = np.empty(self.size, dtype=np.int64)
+        rank[order] = np.arange(self.size)
+        events = np.flatnonzero(self.held[:, 0] < 0)
+        events = events[np.argsort(rank[self.event_org[events]], kind="stable")]
+        return self.event_org[events], self.schedule_slots[events]
+
+    def tally_bookings(self):
+        #per organization: summed popularity of the utilized venues (the most popular one held for each event),
+        #events with a venue, and unused bookings (every further venue held for an event, and every event without one)
+        popularity = np.where(self.held >= 0, self.venue_popularity[self.held], 0)
+        counts = (self.held >= 0).sum(axis=1)
+        popularity_sum = np.bincount(self.event_org, weights=popularity.max(axis=1), minlength=self.size).astype(np.int64)
+        successful = np.bincount(self.event_org, weights=(counts > 0).astype(float), minlength=self.size).astype(np.int64)
+        unused = np.bincount(self.event_org, weights=np.where(counts > 0, counts - 1, 1), minlength=self.size).astype(np.int64)
+        return popularity_sum, successful, unused
+
+    def score_round(self, popularity_sum, successful, unused):
+        #popularity_sum is the summed popularity of each organization's utilized venues this round
+        self.penalty_cost = np.minimum(Organization.PENALTY_CAP, self.penalty_cost + unused * Organization.PENALTY_STEP)
+        payoff = np.maximum(0, popularity_sum * Organization.REWARD_MULTIPLIER - unused * self.penalty_cost)
+        self.current_round_score = payoff
+        self.score += payoff
+        self.budget += popularity_sum * Organization.COST_PER_LEVEL
+        self.total_successful_bookings += successful
+        self.total_unused_bookings += unused
+        return payoff
+
+    def update_reputation(self, avg_round_score):
+        change = np.clip((self.current_round_score - avg_round_score) * Organization.REPUTATION_SCALE,
+                         -Organization.MAX_REPUTATION_CHANGE, Organization.MAX_REPUTATION_CHANGE)
+        self.reputation = np.clip(self.reputation + change, Organization.MIN_REPUTATION, Organization.MAX_REPUTATION)
+        return change
+
+    def update_strategy(self, avg_round_score, generator):
+        to_normal = (self.budget < Organization.LOW_BUDGET) | (
+            (self.reputation < Organization.LOW_REPUTATION) & (self.current_round_score < avg_round_score))
+        to_overbook = (self.current_round_score > avg_round_score) & (self.reputation >= Organization.LOW_REPUTATION)
+        random_strategy = generator.integers(0, len(STRATEGIES), self.size, dtype=np.int8)
+        self.strategy = np.where(to_normal, NORMAL, np.where(to_overbook, OVERBOOK, random_strategy)).astype(np.int8)
+
+    def by_reputation(self):
+        #indices from highest to lowest reputation, ties kept in organization order like sorted(..., reverse=True)
+        return np.argsort(-self.reputation, kind="stable")
+
+
+def _array_attribute(name):
+    array = operator.attrgetter(name)
+
+    def get(self):
+        return array(self.population).item(self.index)
+
+    def set(self, value):
+        array(self.population)[self.index] = value
+
+    return property(get, set)
+
+
+def _shared_attribute(name):
+    return property(operator.attrgetter("population." + name))
+
+
+#Organization backed by row index of a Population, created on demand and holding nothing else.
+#It keeps the full Organization API (booking, per-organization updates, attributes), so small runs and
+#any code written against Organization work unchanged, while the simulation updates all rows at once.
+class OrganizationView(Organization):
+    score = _array_attribute("score")
+    current_round_score = _array_attribute("current_round_score")
+    reputation = _array_attribute("reputation")
+    budget = _array_attribute("budget")
+    penalty_cost = _array_attribute("penalty_cost")
+    total_successful_bookings = _array_attribute("total_successful_bookings")
+    total_unused_bookings = _array_attribute("total_unused_bookings")
+    rng = _shared_attribute("rng")
+    log = _shared_attribute("log")
+    trace = _shared_attribute("trace")
+    profile = _shared_attribute("profile")
+
+    def __init__(self, population, index):
+        self.population = population
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, OrganizationView) and other.population is self.population and other.index == self.index
+
+    def __hash__(self):
+        return self.index
+
+    @property
+    def name(self):
+        return f"Organization {self.index}"
+
+    @property
+    def num_events(self):
+        return self.population.num_events.item(self.index)
+
+    @property
+    def schedule(self):
+        return self.population.schedule(self.index)
+
+    @property
+    def bookings(self):
+        return self.population.bookings(self.index)
+
+    @property
+    def strategy(self):
+        return STRATEGIES[self.population.strategy.item(self.index)]
+
+    @strategy.setter
+    def strategy(self, value):
+        self.population.strategy[self.index] = STRATEGY_CODES[value]
+
+    @property
+    def initial_strategy(self):
+        return STRATEGIES[self.population.initial_strategy.item(self.index)]
+
+    @property
+    def round_scores(self):
+        return [(STRATEGIES[strategies[self.index]], payoffs.item(self.index)) for strategies, payoffs in self.population.round_scores]
+
+    def add_booking(self, venue, slot):
+        self.population.add_booking(self.index, venue, slot)
+
+    def remove_booking(self, venue, slot):
+        self.population.remove_booking(self.index, venue, slot)
+
+
+#The population's organizations as a sequence of OrganizationViews, each created when it is looked up
+class PopulationViews:
+    def __init__(self, population):
+        self.population = population
+
+    def __len__(self):
+        return self.population.size
+
+    def __getitem__(self, index):
+        if not -self.population.size <= index < self.population.size:
+            raise IndexError("organization index out of range")
+        return OrganizationView(self.population, int(index) % self.population.size)
+
+    def __iter__(self):
+        population = self.population
+        return (OrganizationView(population, index) for index in range(population.size))
@@ -0,0 +1,57 @@
+import time
+
+#counters kept for every round of a profiled run
+COUNTERS = (
+    "bookings_attempted",
+    "bookings_succeeded",
+    "overbookings",
+    "budget_rejections",
+    "cancellations",
+    "reserve_allocations",
+    "unmet_demand",
+    "shared_bookings",
+)
+
+
+#Wall time per phase per round plus booking counters for one run of a simulation.
+#A simulation without a profile skips all of this behind a single None check per phase or event.
+class RunProfile:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.rounds = []
+        self.current = None
+
+    def start_round(self, round_number):
+        self.current = {"round": round_number, "phases": {}, "counters": dict.fromkeys(COUNTERS, 0)}
+        self.rounds.append(self.current)
+
+    def time_phase(self, name, phase, *args):
+        start = time.perf_counter()
+        result = phase(*args)
+        elapsed = time.perf_counter() - start
+        if self.current is not None:
+            phases = self.current["phases"]
+            phases[name] = phases.get(name, 0.0) + elapsed
+        return result
+
+    def count(self, counter, amount=1):
+        if self.current is not None:
+            self.current["counters"][counter] += amount
+
+    def report(self):
+        phase_totals = {}
+        counter_totals = dict.fromkeys(COUNTERS, 0)
+        for round_profile in self.rounds:
+            for name, seconds in round_profile["phases"].items():
+                phase_totals[name] = phase_totals.get(name, 0.0) + seconds
+            for name, amount in round_profile["counters"].items():
+                counter_totals[name] += amount
+        return {
+            "rounds": len(self.rounds),
+            "total_seconds": sum(phase_totals.values()),
+            "phase_seconds": phase_totals,
+            "counters": counter_totals,
+            "per_round": self.rounds,
+        }
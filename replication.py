@@ -0,0 +1,145 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from simulation import Simulation
+from events import EventLog, OFF
+from metric_cube import CubeWriter, ARMS
+import metrics
+
+#metrics reported for each arm of every replicate
+METRICS = ("average_score", "successful_bookings", "unused_bookings", "gini", "jain", "theil", "utilization", "rounds")
+
+#z value for a two-sided 95% confidence interval
+Z_95 = 1.96
+
+
+def replicate_seeds(num_replicates, seed=None):
+    #spawn independent child seeds so replicates never share a random stream
+    children = np.random.SeedSequence(seed).spawn(num_replicates)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def run_replicate(params, seed, report=False, cube=None):
+    #run both arms of one replicate (without then with the venue sharing mechanism) from a single seed;
+    #reset_simulation rewinds the simulation's random streams, so the two arms share common random numbers.
+    #cube is an optional (path, scenario, replicate) position in a metric cube to write every round into
+    results = {"seed": seed}
+    writer = CubeWriter(*cube) if cube is not None else None
+    sim = Simulation(**params, seed=seed, log=EventLog(OFF), report_dir=None, cube=writer)
+    for arm, enable_mechanism in zip(ARMS, (False, True)):
+        sim.enable_mechanism = enable_mechanism
+        sim.reset_simulation()
+        sim.run()
+        results[arm] = sim.collect_results()
+        if report:
+            #the plot data travels back with the results so all replicates can be rendered in one batch
+            results[arm]['report'] = sim.report_data(f"seed {seed}, {arm} mechanism")
+    if writer is not None:
+        writer.close()
+    return results
+
+
+def summarize_arms(runs):
+    #every run's organizations as one row of a runs x organizations matrix, so each metric comes out of a single call
+    scores = np.array([list(results['scores'].values()) for results in runs], dtype=float)
+    successful = np.array([list(results['successful_bookings'].values()) for results in runs])
+    unused = np.array([list(results['unused_bookings'].values()) for results in runs])
+    return {
+        "average_score": scores.mean(axis=1),
+        "successful_bookings": successful.sum(axis=1),
+        "unused_bookings": unused.sum(axis=1),
+        **metrics.fairness(scores),
+        "utilization": metrics.utilization(successful, unused),
+        #rounds actually played, fewer than num_periods when the run stopped early
+        "rounds": np.array([results['stop']['round'] for results in runs]),
+    }
+
+
+def summarize_arm(results):
+    return {metric: values[0].item() for metric, values in summarize_arms([results]).items()}
+
+
+def confidence_interval(values):
+    values = np.asarray(values, dtype=float)
+    mean = float(values.mean())
+    if len(values) < 2:
+        return {"mean": mean, "std": 0.0, "ci_low": mean, "ci_high": mean}
+    std = float(values.std(ddof=1))
+    half_width = Z_95 * std / math.sqrt(len(values))
+    return {"mean": mean, "std": std, "ci_low": mean - half_width, "ci_high": mean + half_width}
+
+
+def aggregate(replicates):
+    summary = {}
+    per_arm = {arm: summarize_arms([rep[arm] for rep in replicates]) for arm in ARMS}
+    for arm in ARMS:
+        summary[arm] = {metric: confidence_interval(per_arm[arm][metric]) for metric in METRICS}
+    #paired difference (with - without) per replicate, since both arms of a replicate share a setup and random streams
+    summary["difference"] = {metric: confidence_interval(per_arm["with"][metric] - per_arm["without"][metric]) for metric in METRICS}
+    summary["replicates"] = len(replicates)
+    return summary
+
+
+def run_replicates(params, num_replicates, workers=None, seed=None, report=False):
+    seeds = replicate_seeds(num_replicates, seed)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [run_replicate(params, s, report) for s in seeds]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        #a few replicates per task keeps the pool busy without paying per-task overhead on every replicate
+        chunksize = max(1, num_replicates // (workers * 4))
+        return list(pool.map(run_replicate, [params] * num_replicates, seeds, [report] * num_replicates, chunksize=chunksize))
+
+
+def run_replicates_until(params, target_width, max_replicates, workers=None, seed=None, report=False, metric="average_score"):
+    #runs replicates in batches of one per worker until the 95% confidence interval on the paired (with - without)
+    #difference in metric is at most target_width wide, or max_replicates have run.
+    #The seeds are the first ones run_replicates(params, max_replicates, seed=seed) would use, so a batch that stops
+    #early holds exactly the replicates a full batch starts with. Returns the replicates and why and when they stopped.
+    seeds = replicate_seeds(max_replicates, seed)
+    workers = workers or os.cpu_count() or 1
+    #an interval needs at least two replicates
+    batch_size = max(2, workers)
+    replicates = []
+    stop = {"reason": "max_replicates", "replicates": 0, "width": None, "metric": metric, "target_width": target_width}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while len(replicates) < max_replicates:
+            batch = seeds[len(replicates):len(replicates) + batch_size]
+            if pool is None:
+                replicates.extend(run_replicate(params, s, report) for s in batch)
+            else:
+                replicates.extend(pool.map(run_replicate, [params] * len(batch), batch, [report] * len(batch)))
+            batch_size = workers
+            difference = aggregate(replicates)["difference"][metric]
+            stop["width"] = difference["ci_high"] - difference["ci_low"]
+            stop["replicates"] = len(replicates)
+            if len(replicates) >= 2 and stop["width"] <= target_width:
+                stop["reason"] = "ci_width"
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return replicates, stop
+
+
+def report_runs(replicates):
+    return [rep[arm]['report'] for rep in replicates for arm in ARMS if 'report' in rep[arm]]
+
+
+def print_summary(summary, stop=None):
+    print(f"\nReplication Results ({summary['replicates']} replicates, 95% CI):")
+    if stop is not None:
+        if stop["reason"] == "ci_width":
+            print(f"Stopped after {stop['replicates']} replicates: the {stop['metric']} difference interval is {stop['width']:.2f} wide, within the target of {stop['target_width']}")
+        else:
+            print(f"Ran all {stop['replicates']} replicates; the {stop['metric']} difference interval is still {stop['width']:.2f} wide, above the target of {stop['target_width']}")
+    for section in ARMS + ("difference",):
+        label = {"without": "Without Mechanism", "with": "With Mechanism", "difference": "Difference (with - without)"}[section]
+        print(f"{label}:")
+        for metric in METRICS:
+            stats = summary[section][metric]
+            print(f"  {metric}: {stats['mean']:.2f} [{stats['ci_low']:.2f}, {stats['ci_high']:.2f}]")
@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+
+#matplotlib is only imported inside the render functions, so importing the simulation (or starting a worker
+#process) never loads it; figures are drawn on the Agg canvas and written to files, never shown interactively
+
+STRATEGY_MARKERS = {"normal": "o", "overbook": "s"}  # Circle for normal, square for overbook
+STRATEGY_LABELS = {"normal": "Normal Booking", "overbook": "Overbooking"}
+
+#above this many organizations the per-organization legend entries are dropped (the strategy markers stay)
+MAX_LEGEND_ORGS = 20
+
+
+def _figure(figsize):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def _colors(count):
+    import matplotlib
+    return matplotlib.colormaps["tab10"].resampled(max(count, 1))(np.arange(count))
+
+
+def _save(figure, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    figure.savefig(path)
+    return path
+
+
+def draw_scores(ax, run):
+    from matplotlib.collections import LineCollection
+    from matplotlib.lines import Line2D
+
+    scores = np.asarray(run["scores"], dtype=float)
+    strategies = np.asarray(run["strategies"])
+    ax.set_title(f"Organization Scores Over Time with Strategies ({run['label']})")
+    ax.set_xlabel("Round")
+    ax.set_ylabel("Score")
+    if scores.size == 0:
+        return
+
+    num_orgs, num_rounds = scores.shape
+    colors = _colors(num_orgs)
+    rounds = np.broadcast_to(np.arange(1, num_rounds + 1), scores.shape)
+
+    #every organization's score line in a single collection, then one marker scatter per strategy
+    ax.add_collection(LineCollection(np.stack([rounds, scores], axis=-1), colors=colors))
+    point_colors = np.repeat(colors[:, np.newaxis, :], num_rounds, axis=1)
+    for strategy, marker in STRATEGY_MARKERS.items():
+        mask = strategies == strategy
+        ax.scatter(rounds[mask], scores[mask], c=point_colors[mask], marker=marker, s=64)
+    ax.autoscale_view()
+
+    legend = []
+    if num_orgs <= MAX_LEGEND_ORGS:
+        legend = [Line2D([0], [0], color=colors[idx], lw=2, label=name) for idx, name in enumerate(run["names"])]
+    legend += [Line2D([0], [0], marker=marker, color='w', label=label, markerfacecolor='black', markersize=8)
+               for label, marker in STRATEGY_MARKERS.items()]
+    ax.legend(handles=legend, loc='upper left', bbox_to_anchor=(1, 1))
+
+
+def draw_strategy_comparison(ax, run):
+    averages = run["strategy_averages"]
+    ax.bar([STRATEGY_LABELS[strategy] for strategy in averages], list(averages.values()))
+    ax.set_title(f"Comparison of Average Scores by Strategy ({run['label']})")
+    ax.set_ylabel("Average Score")
+
+
+def render_scores(run, path):
+    figure = _figure((12, 6))
+    draw_scores(figure.add_subplot(), run)
+    figure.tight_layout()
+    return _save(figure, path)
+
+
+def render_strategy_comparison(run, path):
+    figure = _figure((6.4, 4.8))
+    draw_strategy_comparison(figure.add_subplot(), run)
+    figure.tight_layout()
+    return _save(figure, path)
+
+
+def render_report(runs, path):
+    #batch many runs (both arms of a run, or every replicate) into one multi-page PDF, one page per run
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with PdfPages(path) as pdf:
+        for run in runs:
+            figure = _figure((16, 6))
+            score_ax, strategy_ax = figure.subplots(1, 2, gridspec_kw={"width_ratios": (3, 1)})
+            draw_scores(score_ax, run)
+            draw_strategy_comparison(strategy_ax, run)
+            figure.tight_layout()
+            pdf.savefig(figure)
+    return path
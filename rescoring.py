@@ -0,0 +1,238 @@
+import argparse
+import csv
+import itertools
+
+import numpy as np
+
+import metrics
+from booking_trace import read_trace, RUN_START, SCHEDULE, BOOK, OVERBOOK, CANCEL, RESERVE, SHARE, STRATEGY
+from organization import Organization
+from population import STRATEGIES, STRATEGY_CODES, NORMAL
+
+#Re-scoring of a recorded run under many payoff parameter sets at once.
+#The trace holds every booking decision, so the venues each organization ends a round with (after cancellations,
+#reserve allocation and sharing) can be rebuilt without re-running the booking phases. Scores, penalties, budgets,
+#reputations and the strategy update are then replayed for the whole grid of parameter sets as parameter sets x
+#organizations arrays, one round at a time.
+#
+#The bookings stay the recorded ones, which is only what a full re-run would produce while the re-scored run would
+#have booked the same way. Booking depends on the strategy each organization plays and on the reputation order
+#organizations book (and get reserve venues) in, so a parameter set's replay diverges from a re-run once either differs
+#from the recorded run:
+#  - strategy: the update rule picks a different strategy than the one recorded for the next round, or sends a
+#    different set of organizations to the random switch (whose draws the trace cannot tell apart)
+#  - order: the reputation ranking differs from the recorded run's
+#Budgets never diverge: booking costs and revenue depend on the venues only, not on these parameters.
+#The recorded run's ranking and random switches come from replaying it with the Organization constants (the
+#parameters the simulation runs with), which are prepended to every grid as the baseline.
+
+#Organization constants a parameter set can override, by parameter name
+PARAMETERS = {
+    "reward_multiplier": "REWARD_MULTIPLIER",
+    "penalty_step": "PENALTY_STEP",
+    "penalty_cap": "PENALTY_CAP",
+    "reputation_scale": "REPUTATION_SCALE",
+    "max_reputation_change": "MAX_REPUTATION_CHANGE",
+    "low_budget": "LOW_BUDGET",
+    "low_reputation": "LOW_REPUTATION",
+}
+
+#starting state of every organization, as set in Organization.__init__
+INITIAL_SCORE = 0
+INITIAL_REPUTATION = 100
+INITIAL_PENALTY = 1
+INITIAL_BUDGET = 200
+
+OVERBOOK_STRATEGY = STRATEGY_CODES["overbook"]
+
+
+def baseline_parameters():
+    return {name: getattr(Organization, constant) for name, constant in PARAMETERS.items()}
+
+
+def parameter_grid(**values):
+    #every combination of the given values, e.g. parameter_grid(reward_multiplier=[3, 5, 7], penalty_cap=[5, 10]);
+    #parameters not given keep their Organization value. Returns one array per parameter, one entry per set.
+    unknown = set(values) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown payoff parameters: {sorted(unknown)}")
+    grid = {name: values.get(name, [value]) for name, value in baseline_parameters().items()}
+    combinations = list(itertools.product(*grid.values()))
+    return {name: np.array([combination[i] for combination in combinations], dtype=float) for i, name in enumerate(grid)}
+
+
+def split_runs(records):
+    #one slice of records per run (both mechanism arms of a simulation go into the same trace)
+    starts = np.flatnonzero(records["event"] == RUN_START)
+    ends = list(starts[1:]) + [len(records)]
+    return [records[start:end] for start, end in zip(starts, ends)]
+
+
+def round_outcomes(header, run):
+    #per round of one run: the strategy codes played, what each organization spent on bookings, and its
+    #utilized venues' popularity sum, successful and unused bookings as Simulation.tally_bookings counts them
+    num_orgs = len(header["organizations"])
+    num_venues = len(header["venues"])
+    num_slots = len(header["time_slots"])
+    popularity = np.array(header["popularity"], dtype=np.int64)
+    rounds = run["round"]
+    if not np.any(run["event"] == STRATEGY):
+        raise ValueError("The trace has no strategy records; record it again with this version of the simulation")
+    outcomes = []
+    for round_number in np.unique(rounds[rounds > 0]):
+        start, end = np.searchsorted(rounds, [round_number, round_number + 1])
+        records = run[start:end]
+        event = records["event"]
+        org = records["org"].astype(np.int64)
+        venue = records["venue"].astype(np.int64)
+        slot = records["slot"].astype(np.int64)
+
+        played = event == STRATEGY
+        strategy = np.full(num_orgs, NORMAL, dtype=np.int8)
+        strategy[org[played]] = venue[played]
+        scheduled = np.bincount(org[event == SCHEDULE], minlength=num_orgs)
+        paid = (event == BOOK) | (event == OVERBOOK)
+        spent = np.bincount(org[paid], weights=popularity[venue[paid]] * Organization.COST_PER_LEVEL, minlength=num_orgs).astype(np.int64)
+
+        #a venue is held for a slot if it was booked, overbooked, allocated or shared more often than cancelled there
+        added = paid | (event == RESERVE) | (event == SHARE)
+        changed = added | (event == CANCEL)
+        keys = (org[changed] * num_venues + venue[changed]) * num_slots + slot[changed]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        net = np.bincount(inverse, weights=np.where(added[changed], 1, -1), minlength=len(keys))
+        held_org, rest = np.divmod(keys[net > 0], num_venues * num_slots)
+        held_venue, held_slot = np.divmod(rest, num_slots)
+
+        #one utilized venue (the most popular) per organization and slot; the rest are unused overbookings
+        pairs, inverse, held = np.unique(held_org * num_slots + held_slot, return_inverse=True, return_counts=True)
+        utilized = np.zeros(len(pairs), dtype=np.int64)
+        np.maximum.at(utilized, inverse, popularity[held_venue])
+        pair_org = pairs // num_slots
+        successful = np.bincount(pair_org, minlength=num_orgs)
+        unused = np.bincount(pair_org, weights=held - 1, minlength=num_orgs).astype(np.int64) + scheduled - successful
+        outcomes.append({
+            "round": int(round_number),
+            "strategy": strategy,
+            "spent": spent,
+            "popularity_sum": np.bincount(pair_org, weights=utilized, minlength=num_orgs).astype(np.int64),
+            "successful": successful,
+            "unused": unused,
+        })
+    return outcomes
+
+
+def rescore(outcomes, grid):
+    #replays the end-of-round rules of Population for every parameter set in grid (see parameter_grid) at once
+    baseline = baseline_parameters()
+    params = {name: np.concatenate(([baseline[name]], grid[name]))[:, None] for name in PARAMETERS}
+    num_sets = len(next(iter(params.values())))
+    num_orgs = len(outcomes[0]["strategy"]) if outcomes else 0
+    num_rounds = len(outcomes)
+
+    score = np.full((num_sets, num_orgs), float(INITIAL_SCORE))
+    reputation = np.full((num_sets, num_orgs), float(INITIAL_REPUTATION))
+    penalty_cost = np.full((num_sets, num_orgs), float(INITIAL_PENALTY))
+    budget = np.full(num_orgs, INITIAL_BUDGET, dtype=np.int64)
+    payoff_sums = np.zeros((num_sets, len(STRATEGIES)))
+    plays = np.zeros(len(STRATEGIES), dtype=np.int64)
+    round_payoff = np.zeros((num_rounds, num_sets))
+    #row r covers the bookings of round r + 1; the first round always starts from the recorded state
+    strategy_mismatches = np.zeros((num_rounds, num_sets), dtype=np.int64)
+    order_changed = np.zeros((num_rounds, num_sets), dtype=bool)
+
+    for r, outcome in enumerate(outcomes):
+        unused = outcome["unused"]
+        penalty_cost = np.minimum(params["penalty_cap"], penalty_cost + unused * params["penalty_step"])
+        payoff = np.maximum(0, outcome["popularity_sum"] * params["reward_multiplier"] - unused * penalty_cost)
+        score += payoff
+        budget += outcome["popularity_sum"] * Organization.COST_PER_LEVEL - outcome["spent"]
+        round_payoff[r] = payoff.mean(axis=1)
+        for code in range(len(STRATEGIES)):
+            playing = outcome["strategy"] == code
+            payoff_sums[:, code] += payoff[:, playing].sum(axis=1)
+            plays[code] += playing.sum()
+
+        average = payoff.mean(axis=1, keepdims=True)
+        change = np.clip((payoff - average) * params["reputation_scale"], -params["max_reputation_change"], params["max_reputation_change"])
+        reputation = np.clip(reputation + change, Organization.MIN_REPUTATION, Organization.MAX_REPUTATION)
+
+        if r + 1 == num_rounds:
+            break
+        to_normal = (budget < params["low_budget"]) | ((reputation < params["low_reputation"]) & (payoff < average))
+        to_overbook = ~to_normal & (payoff > average) & (reputation >= params["low_reputation"])
+        switched_randomly = ~to_normal & ~to_overbook
+        recorded = outcomes[r + 1]["strategy"]
+        wrong_rule = (to_normal & (recorded != NORMAL)) | (to_overbook & (recorded != OVERBOOK_STRATEGY))
+        strategy_mismatches[r + 1] = (wrong_rule | (switched_randomly != switched_randomly[0])).sum(axis=1)
+        ranking = np.argsort(-reputation, axis=1, kind="stable")
+        order_changed[r + 1] = np.any(ranking != ranking[0], axis=1)
+
+    diverged = (strategy_mismatches > 0) | order_changed
+    with np.errstate(divide="ignore", invalid="ignore"):
+        averages = np.where(plays > 0, payoff_sums / plays, 0.0)
+    #drop the baseline row
+    return {
+        "parameters": {name: values[1:, 0] for name, values in params.items()},
+        "rounds": num_rounds,
+        "score": score[1:],
+        "reputation": reputation[1:],
+        "penalty_cost": penalty_cost[1:],
+        "budget": budget,
+        "round_payoff": round_payoff[:, 1:],
+        "strategy_averages": {strategy: averages[1:, code] for code, strategy in enumerate(STRATEGIES)},
+        "fairness": metrics.fairness(score[1:]),
+        "strategy_mismatches": strategy_mismatches[:, 1:],
+        "order_changed": order_changed[:, 1:],
+        #first round whose recorded bookings a full re-run with the set may not reproduce, 0 if the replay never diverges
+        "diverged_round": np.where(diverged[:, 1:].any(axis=0), diverged[:, 1:].argmax(axis=0) + 1, 0),
+    }
+
+
+def rescore_trace(path, grid):
+    #one re-scoring result per run recorded in the trace, with the run's enable_mechanism flag
+    header, records = read_trace(path)
+    results = []
+    for run in split_runs(records):
+        result = rescore(round_outcomes(header, run), grid)
+        result["enable_mechanism"] = bool(run["venue"][0])
+        results.append(result)
+    return results
+
+
+def result_rows(results):
+    rows = []
+    for result in results:
+        arm = "with_mechanism" if result["enable_mechanism"] else "without_mechanism"
+        for i in range(len(result["diverged_round"])):
+            row = {"arm": arm}
+            row.update({name: float(values[i]) for name, values in result["parameters"].items()})
+            row["average_score"] = float(result["score"][i].mean())
+            row.update({metric: float(values[i]) for metric, values in result["fairness"].items()})
+            row.update({f"{strategy}_average_payoff": float(values[i]) for strategy, values in result["strategy_averages"].items()})
+            diverged_round = int(result["diverged_round"][i])
+            row["diverged_round"] = diverged_round if diverged_round else ""
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score a recorded simulation trace under a grid of payoff parameters.")
+    parser.add_argument('trace', help='Trace file written with main.py --trace')
+    for name, constant in PARAMETERS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=float, nargs='+', default=None,
+                            help=f'Values of Organization.{constant} to re-score with (default {getattr(Organization, constant)})')
+    parser.add_argument('--output', default='rescoring.csv', help='CSV file with one row per run and parameter set')
+    args = parser.parse_args()
+
+    grid = parameter_grid(**{name: getattr(args, name) for name in PARAMETERS if getattr(args, name) is not None})
+    rows = result_rows(rescore_trace(args.trace, grid))
+    with open(args.output, "w", newline="") as table:
+        writer = csv.DictWriter(table, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    exact = sum(1 for row in rows if row["diverged_round"] == "")
+    print(f"Wrote {len(rows)} rows to {args.output}; {exact} replay the recorded bookings exactly, the rest diverge from a full re-run at the round given in diverged_round")
+
+
+if __name__ == "__main__":
+    main()
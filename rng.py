@@ -0,0 +1,31 @@
+import random
+
+import numpy as np
+
+#Independent random streams for a single simulation, one per source of randomness.
+#All streams are derived from the simulation seed, so a seeded run is reproducible. The setup stream builds the
+#organizations and venues once; reset() rewinds the per-round streams so that both mechanism arms of
+#run_simulations draw common random numbers for schedules, venue choice, cancellations and strategy updates.
+class SimulationRNG:
+    STREAMS = ("venue_choice", "cancellations", "strategy")
+    #streams used for whole-array draws are NumPy generators
+    ARRAY_STREAMS = ("schedules", "cancellations_array", "strategy_array")
+
+    def __init__(self, seed=None):
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.setup = self._python_stream(0)
+        self.reset()
+
+    def _child(self, key):
+        return np.random.SeedSequence(self.seed, spawn_key=(key,))
+
+    def _python_stream(self, key):
+        return random.Random(int.from_bytes(self._child(key).generate_state(4).tobytes(), "little"))
+
+    def reset(self):
+        for key, name in enumerate(self.STREAMS, start=1):
+            setattr(self, name, self._python_stream(key))
+        #batched schedules, the array engine's cancellation mask and the array population's strategy draws
+        #come from NumPy generators on their own substreams
+        for key, name in enumerate(self.ARRAY_STREAMS, start=len(self.STREAMS) + 1):
+            setattr(self, name, np.random.default_rng(self._child(key)))
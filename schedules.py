@@ -0,0 +1,97 @@
+import numpy as np
+
+#minimum time between two events of the same organization, in hours (the unit slot times are in)
+MIN_GAP = 2
+
+
+def gap_positions(time_slots, min_gap=MIN_GAP):
+    #slot times as whole slot lengths from the first slot, with every break between neighbouring slots that is longer than
+    #the gap (the night between two days of a calendar) shortened to the gap, and the gap in slot lengths. Two slots are
+    #at least min_gap apart in time exactly when their positions are at least the returned gap apart.
+    times = np.asarray(time_slots, dtype=float)
+    steps = np.diff(times)
+    slot_length = steps.min() if len(steps) else 1.0
+    gap = max(1, int(round(min_gap / slot_length)))
+    steps = np.minimum(np.rint(steps / slot_length).astype(np.int64), gap)
+    return np.concatenate(([0], np.cumsum(steps))), gap
+
+
+def max_events(time_slots, min_gap=MIN_GAP):
+    #largest schedule that fits: the earliest slot, then every next slot at least min_gap later
+    positions, gap = gap_positions(time_slots, min_gap)
+    if len(positions) == 0:
+        return 0
+    count, position = 1, 0
+    while True:
+        position = np.searchsorted(positions, positions[position] + gap)
+        if position == len(positions):
+            return count
+        count += 1
+
+
+def check_feasible(num_events, time_slots, min_gap=MIN_GAP):
+    limit = max_events(time_slots, min_gap)
+    if num_events > limit:
+        raise ValueError(f"Cannot schedule {num_events} events in {len(time_slots)} time slots at least {min_gap} hours apart; at most {limit} fit")
+
+
+#Draws gap-constrained schedules directly instead of by rejection, every feasible schedule equally likely.
+#On a contiguous grid (one day), picking k events at least g slots apart out of n slots is the same as picking k
+#distinct positions out of n - (g - 1)(k - 1) and then spreading the i-th smallest position out by (g - 1) * i.
+#Breaks in the grid (several days) need _sample_with_breaks instead. Organizations with the same number of events are
+#drawn together as one matrix, so a whole round takes one batch per distinct event count.
+def sample_schedules(num_events, time_slots, generator, min_gap=MIN_GAP):
+    offsets, flat = sample_schedule_arrays(num_events, time_slots, generator, min_gap)
+    return [flat[offsets[i]:offsets[i + 1]].tolist() for i in range(len(offsets) - 1)]
+
+
+def sample_schedule_arrays(num_events, time_slots, generator, min_gap=MIN_GAP):
+    #the same draws as one flat array of slots with row i's schedule at flat[offsets[i]:offsets[i + 1]] (CSR layout)
+    num_events = np.asarray(num_events, dtype=np.int64)
+    slots = np.asarray(time_slots)
+    positions, gap = gap_positions(slots, min_gap)
+    contiguous = len(slots) == 0 or positions[-1] == len(slots) - 1
+    offsets = np.concatenate(([0], np.cumsum(num_events)))
+    flat = np.empty(offsets[-1], dtype=slots.dtype)
+    for k in np.unique(num_events):
+        k = int(k)
+        rows = np.flatnonzero(num_events == k)
+        if k == 0:
+            continue
+        check_feasible(k, slots, min_gap)
+        if contiguous:
+            compressed = len(slots) - (gap - 1) * (k - 1)
+            #a random k-subset per row: the positions of the k smallest keys in a row of uniform draws
+            keys = generator.random((len(rows), compressed))
+            chosen = np.sort(np.argpartition(keys, k - 1, axis=1)[:, :k], axis=1)
+            chosen += (gap - 1) * np.arange(k)
+        else:
+            chosen = _sample_with_breaks(positions, gap, k, len(rows), generator)
+        flat[offsets[rows][:, None] + np.arange(k)] = slots[chosen]
+    return offsets, flat
+
+
+def _sample_with_breaks(positions, gap, k, num_rows, generator):
+    #slot indices of num_rows schedules of k events, positions (see gap_positions) at least gap apart.
+    #log_ways[r][s] is the log of the number of schedules of r events among slots s onwards (in logs, as the counts
+    #outgrow floats on long calendars). The events are drawn in order for all rows at once: from slot s, the next event
+    #is at slot i or earlier with probability 1 - ways[r][i + 1] / ways[r][s], inverted by a search over log_ways[r].
+    n = len(positions)
+    following = np.searchsorted(positions, positions + gap)
+    log_ways = [np.zeros(n + 1)]
+    for r in range(1, k + 1):
+        log_weights = log_ways[r - 1][following]
+        log_ways.append(np.concatenate((np.logaddexp.accumulate(log_weights[::-1])[::-1], [-np.inf])))
+    chosen = np.empty((num_rows, k), dtype=np.int64)
+    start = np.zeros(num_rows, dtype=np.int64)
+    for event in range(k):
+        remaining = k - event
+        #nondecreasing, so the first slot whose tail drops below the drawn level is found by bisection
+        tails = -log_ways[remaining][1:]
+        levels = -log_ways[remaining][start] - np.log1p(-generator.random(num_rows))
+        #rounding can only push a draw past the last slot that still fits the remaining events
+        last = np.flatnonzero(log_ways[remaining - 1][following] > -np.inf)[-1]
+        pick = np.minimum(np.searchsorted(tails, levels, side="right"), last)
+        chosen[:, event] = pick
+        start = following[pick]
+    return chosen
@@ -0,0 +1,331 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from simulation import Simulation
+from events import EventLog, OFF
+from timegrid import Calendar
+from replication import summarize_arm
+from metric_cube import ARMS
+from population import STRATEGY_CODES
+
+#Long-lived simulation service speaking JSON lines, over stdin/stdout or localhost TCP connections.
+#Workers are started and warmed (interpreter up, simulation and NumPy imported) once, so a request only pays for its
+#own rounds. Requests, one JSON object per line:
+#  {"op": "run", "id": "q1", "params": {...}, "seed": 7, "arms": ["without", "with"], "progress": true, "full": false}
+#      params are Simulation constructor parameters; "calendar" takes Calendar's parameters as an object
+#  {"op": "cancel", "id": "q1"}   stop a queued or running job at the end of its current round
+#  {"op": "status"}               ids of the jobs in progress
+#  {"op": "ping"}
+#  {"op": "shutdown"}             cancel every job and stop the service
+#Responses carry the request's id and an event: "queued", then "round" per finished round (unless progress is false),
+#then one of "result", "cancelled" or "error". End of input stops reading but lets the jobs in progress finish.
+
+#Simulation parameters that belong to the service, not to a request
+RESERVED_PARAMS = ("seed", "log", "trace", "checkpoint", "cube", "progress", "report_dir")
+
+#set in each worker by _init_worker
+_messages = None
+_cancelled = None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _init_worker(messages, cancelled):
+    global _messages, _cancelled
+    _messages = messages
+    _cancelled = cancelled
+
+
+def _warm_up():
+    return os.getpid()
+
+
+#Progress listener of a job's simulation (see Simulation.progress): streams a summary of every round and stops the
+#run once the job has been cancelled
+class JobProgress:
+    def __init__(self, ticket, stream):
+        self.ticket = ticket
+        self.stream = stream
+        self.arm = None
+
+    def round_finished(self, simulation):
+        if self.ticket in _cancelled:
+            raise JobCancelled()
+        if self.stream:
+            strategies, reputations = simulation.strategy_profile()
+            _messages.put((self.ticket, {
+                "event": "round",
+                "arm": self.arm,
+                "round": simulation.current_period,
+                "num_periods": simulation.num_periods,
+                "average_score": simulation.get_average_score(),
+                "average_reputation": float(np.mean(reputations)),
+                "overbook_share": float(np.mean(np.asarray(strategies) == STRATEGY_CODES["overbook"])),
+            }))
+
+
+def run_job(ticket, params, seed, arms, stream, full):
+    #runs in a worker: the arms of one request, as run_replicate runs them. Every outcome goes through the message
+    #queue, after the job's round messages, so a client always sees its rounds before the result.
+    started = time.perf_counter()
+    try:
+        #cancelled after the pool had already handed it to a worker
+        if ticket in _cancelled:
+            raise JobCancelled()
+        params = dict(params)
+        if isinstance(params.get("calendar"), dict):
+            params["calendar"] = Calendar(**params["calendar"])
+        progress = JobProgress(ticket, stream)
+        sim = Simulation(**params, seed=seed, log=EventLog(OFF), report_dir=None, progress=progress)
+        results = {}
+        for arm in arms:
+            progress.arm = arm
+            sim.enable_mechanism = arm == "with"
+            sim.reset_simulation()
+            sim.run()
+            results[arm] = sim.collect_results()
+        summary = {arm: {**summarize_arm(results[arm]), "stop": results[arm]["stop"]} for arm in arms}
+        message = {"event": "result", "seed": sim.seed, "seconds": time.perf_counter() - started, "arms": summary}
+        if full:
+            message["results"] = results
+    except JobCancelled:
+        message = {"event": "cancelled"}
+    except Exception as error:
+        message = {"event": "error", "message": f"{type(error).__name__}: {error}"}
+    _messages.put((ticket, message))
+
+
+#One client: a line-oriented output the service writes responses to, one JSON object per line
+class Session:
+    def __init__(self, output):
+        self.output = output
+        self.lock = threading.Lock()
+        self.open = True
+
+    def send(self, message):
+        line = json.dumps(message) + "\n"
+        with self.lock:
+            if not self.open:
+                return
+            try:
+                self.output.write(line)
+                self.output.flush()
+            except (OSError, ValueError):
+                #the client went away; its jobs are cancelled by whoever reads its input
+                self.open = False
+
+    def close(self):
+        with self.lock:
+            self.open = False
+            try:
+                self.output.close()
+            except OSError:
+                pass
+
+
+class SimulationService:
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.manager = multiprocessing.Manager()
+        self.messages = multiprocessing.Queue()
+        #tickets of cancelled jobs, checked by the workers every round
+        self.cancelled = self.manager.dict()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.messages, self.cancelled))
+        #one task per worker at once makes the pool start every worker now rather than on the first requests
+        for future in [self.pool.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+        self.lock = threading.Lock()
+        self.next_ticket = 0
+        #ticket -> (session, request id, future) of every job in progress
+        self.jobs = {}
+        self.idle = threading.Condition(self.lock)
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def _dispatch(self):
+        #hands every worker message to the session that asked for the job
+        while True:
+            ticket, message = self.messages.get()
+            if ticket is None:
+                return
+            with self.lock:
+                job = self.jobs.get(ticket)
+                if job is not None and message["event"] != "round":
+                    self._finish(ticket)
+            if job is not None:
+                job[0].send({"id": job[1], **message})
+
+    def _finish(self, ticket):
+        #with self.lock held
+        del self.jobs[ticket]
+        self.cancelled.pop(ticket, None)
+        self.idle.notify_all()
+
+    def handle(self, session, line):
+        #answers one request line; returns False once the service should shut down
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+        except ValueError as error:
+            session.send({"event": "error", "message": f"Invalid request: {error}"})
+            return True
+        op = request.get("op", "run")
+        request_id = request.get("id")
+        if op == "run":
+            self.submit(session, request_id, request)
+        elif op == "cancel":
+            self.cancel(session, request_id)
+        elif op == "status":
+            with self.lock:
+                running = [job_id for job_session, job_id, _ in self.jobs.values() if job_session is session]
+            session.send({"id": request_id, "event": "status", "jobs": running, "workers": self.workers})
+        elif op == "ping":
+            session.send({"id": request_id, "event": "pong"})
+        elif op == "shutdown":
+            session.send({"id": request_id, "event": "shutdown"})
+            return False
+        else:
+            session.send({"id": request_id, "event": "error", "message": f"Unknown op {op!r}"})
+        return True
+
+    def submit(self, session, request_id, request):
+        params = request.get("params", {})
+        arms = request.get("arms", list(ARMS))
+        problems = []
+        if not isinstance(params, dict):
+            problems.append("params must be an object")
+        else:
+            problems += [f"{name} is set by the service" for name in RESERVED_PARAMS if name in params]
+        problems += [f"unknown arm {arm!r}" for arm in arms if arm not in ARMS]
+        with self.lock:
+            if any(job_session is session and job_id == request_id for job_session, job_id, _ in self.jobs.values()):
+                problems.append(f"a job with id {request_id!r} is already in progress")
+            if problems:
+                session.send({"id": request_id, "event": "error", "message": "; ".join(problems)})
+                return
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            future = self.pool.submit(run_job, ticket, params, request.get("seed"), arms, request.get("progress", True), request.get("full", False))
+            self.jobs[ticket] = (session, request_id, future)
+            future.add_done_callback(lambda done, ticket=ticket: self._check_failed(ticket, done))
+        session.send({"id": request_id, "event": "queued"})
+
+    def _check_failed(self, ticket, future):
+        #run_job reports its own outcome, so an exception here means the worker died (the pool is then broken)
+        if not future.cancelled() and future.exception() is not None:
+            self.messages.put((ticket, {"event": "error", "message": f"Worker failed: {future.exception()!r}"}))
+
+    def cancel(self, session, request_id):
+        with self.lock:
+            tickets = [ticket for ticket, (job_session, job_id, _) in self.jobs.items() if job_session is session and job_id == request_id]
+            for ticket in tickets:
+                future = self.jobs[ticket][2]
+                if future.cancel():
+                    #never started, so no worker will report it
+                    self._finish(ticket)
+                    session.send({"id": request_id, "event": "cancelled"})
+                else:
+                    self.cancelled[ticket] = True
+        if not tickets:
+            session.send({"id": request_id, "event": "error", "message": f"No job with id {request_id!r} in progress"})
+
+    def cancel_session(self, session):
+        with self.lock:
+            job_ids = [job_id for job_session, job_id, _ in self.jobs.values() if job_session is session]
+        for job_id in job_ids:
+            self.cancel(session, job_id)
+
+    def serve(self, session, lines):
+        #answers requests from lines until they run out or one asks for a shutdown
+        for line in lines:
+            if line.strip() and not self.handle(session, line):
+                return False
+        return True
+
+    def wait(self, session=None):
+        #until the jobs of session (or every job) are done
+        with self.lock:
+            self.idle.wait_for(lambda: not any(session is None or job[0] is session for job in self.jobs.values()))
+
+    def close(self):
+        with self.lock:
+            sessions = {job[0] for job in self.jobs.values()}
+        for session in sessions:
+            self.cancel_session(session)
+        self.wait()
+        self.messages.put((None, None))
+        self.dispatcher.join()
+        self.pool.shutdown()
+        self.manager.shutdown()
+
+
+def serve_stdio(service):
+    session = Session(sys.stdout)
+    if service.serve(session, sys.stdin):
+        #end of input: let the submitted jobs finish before exiting
+        service.wait(session)
+
+
+def serve_tcp(service, port):
+    listener = socket.create_server(("127.0.0.1", port))
+    #accept wakes up regularly so a shutdown from any client is noticed
+    listener.settimeout(0.5)
+    print(json.dumps({"event": "listening", "port": listener.getsockname()[1]}), flush=True)
+    stopping = threading.Event()
+
+    def client(connection):
+        with connection, connection.makefile("r") as reader:
+            session = Session(connection.makefile("w"))
+            try:
+                keep_serving = service.serve(session, reader)
+            except OSError:
+                #connection reset
+                keep_serving = True
+            if keep_serving:
+                #the client hung up: nobody is left to read its results
+                service.cancel_session(session)
+                service.wait(session)
+            else:
+                stopping.set()
+            session.close()
+
+    with listener:
+        while not stopping.is_set():
+            try:
+                connection, _ = listener.accept()
+            except socket.timeout:
+                continue
+            connection.settimeout(None)
+            threading.Thread(target=client, args=(connection,), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve simulation requests as JSON lines from a warm worker pool.")
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--port', type=int, default=None, help='Listen on this localhost TCP port (0 picks one) instead of stdin/stdout')
+    args = parser.parse_args()
+
+    service = SimulationService(args.workers)
+    try:
+        if args.port is None:
+            serve_stdio(service)
+        else:
+            serve_tcp(service, args.port)
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,80 @@
 from organization import Organization
+from population import Population, PopulationViews, STRATEGIES, STRATEGY_CODES
+from strategy_stats import StrategyStats
+from convergence import ConvergenceMonitor
 from venue import Venue
-import random
+from occupancy import OccupancyGrid
+from venue_index import FreeVenueIndex, ReserveQueue
+from rng import SimulationRNG
+from events import EventLog, OFF, SUMMARY, ROUND, BOOKING
+from booking_trace import SCHEDULE, CANCEL, RESERVE, SHARE
+from schedules import check_feasible, sample_schedules, sample_schedule_arrays
+from timegrid import Calendar
+from allocation import split_budget, clear_slot
+from profiling import RunProfile
+import copy
+import pickle
 import time
-import matplotlib.pyplot as plt
-from matplotlib.lines import Line2D
-import matplotlib.cm as cm
+from concurrent.futures import ProcessPoolExecutor
+import os
 import numpy as np
+import reporting
+import metrics
 
 class Simulation:
-    def __init__(self, num_orgs, num_venues, num_periods, cancellation_rate, enable_mechanism=True):
-        #hardcoded time slots for the simulation
-        self.time_slots = [hour for hour in range(8, 24)]
-
-        #create organizations and venues as per the instantiation parameters. 
-        self.organizations = [Organization(f"Organization {i}", random.randint(1,5), []) for i in range(num_orgs)]
-        self.venues = [Venue(f"Venue {i}", random.randint(1, 5), self.time_slots) for i in range(num_venues)]
+    ENGINES = ("objects", "array")
+    POPULATIONS = ("objects", "arrays")
+    ALLOCATIONS = ("sequential", "batch")
+    VENUE_HOURS = ("calendar", "varied")
+
+    def __init__(self, num_orgs, num_venues, num_periods, cancellation_rate, enable_mechanism=True, engine="objects", seed=None, log=None, trace=None, nash_interval=0, nash_workers=1, population="objects", profile=False, report_dir="reports", checkpoint=None, allocation="sequential", allocation_workers=1, keep_history=True, calendar=None, venue_hours="calendar", stop_tolerance=None, stop_window=5, cube=None, progress=None, sharing_capacity=None):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {self.ENGINES}")
+        if population not in self.POPULATIONS:
+            raise ValueError(f"Unknown population {population!r}, expected one of {self.POPULATIONS}")
+        if allocation not in self.ALLOCATIONS:
+            raise ValueError(f"Unknown allocation {allocation!r}, expected one of {self.ALLOCATIONS}")
+        if venue_hours not in self.VENUE_HOURS:
+            raise ValueError(f"Unknown venue hours {venue_hours!r}, expected one of {self.VENUE_HOURS}")
+        if sharing_capacity is not None and sharing_capacity < 1:
+            raise ValueError(f"Sharing capacity must be at least 1, got {sharing_capacity}")
+
+        #leveled event log that replaces printing; disabled levels are not formatted at all
+        self.log = log if log is not None else EventLog()
+
+        #random streams for this simulation; the same seed reproduces the same run
+        self.rng = SimulationRNG(seed)
+        self.seed = self.rng.seed
+
+        #days and time slots being booked; the default is a single day of hourly slots from 8:00 to 24:00
+        self.calendar = calendar if calendar is not None else Calendar()
+        self.time_slots = self.calendar.slots
+
+        #create organizations and venues as per the instantiation parameters.
+        #"objects" gives every organization its own attributes and updates them one at a time
+        #"arrays" keeps their state, schedules and bookings in a Population of NumPy arrays and updates it for everyone at once;
+        #organizations are then looked up as OrganizationViews made on demand
+        if population == "arrays":
+            #the same setup draws per organization as Organization makes, so both storages start from the same profile
+            num_events = np.empty(num_orgs, dtype=np.int64)
+            initial_strategy = np.empty(num_orgs, dtype=np.int8)
+            for i in range(num_orgs):
+                num_events[i] = self.rng.setup.randint(1,5) * self.calendar.days
+                initial_strategy[i] = STRATEGY_CODES[self.rng.setup.choice(["overbook", "normal"])]
+            event_counts = np.unique(num_events).tolist()
+        else:
+            self.organizations = [Organization(f"Organization {i}", self.rng.setup.randint(1,5) * self.calendar.days, [], rng=self.rng, log=self.log) for i in range(num_orgs)]
+            event_counts = sorted({org.num_events for org in self.organizations})
+        #reject event counts that cannot fit in the calendar before any schedule is drawn
+        for count in event_counts:
+            check_feasible(count, self.time_slots, self.calendar.min_gap)
+        #most organizations that can share one venue in a slot under the mechanism (None for no limit)
+        self.sharing_capacity = sharing_capacity
+        self.venues = [Venue(f"Venue {i}", self.rng.setup.randint(1, 5), self.time_slots, log=self.log, capacity=sharing_capacity) for i in range(num_venues)]
+        #"calendar" keeps every venue open for the calendar's whole day; "varied" gives each venue its own daily opening hours
+        if venue_hours == "varied":
+            for venue in self.venues:
+                venue.opening_hours = self.calendar.random_opening_hours(self.rng.setup)
 
         #the number of periods/times to run the simulation for
         self.num_periods = num_periods
@@ -24,140 +84,365 @@ class Simulation:
 
         #reserve venues are randomly selected from the total number of venues. 
         #This represents the venues that the university will book for organizations if the organizations have not booked a venue
-        self.reserve_venues = random.sample(self.venues, max(1, num_venues // 5))
-        for venue in self.reserve_venues:
-            self.venues.remove(venue)
-
-        self.score_history = {org.name: [] for org in self.organizations}  # Store scores for each organization
-        self.strategy_history = {org.name: [] for org in self.organizations}  # Store strategies for each organization
+        self.reserve_venues = self.rng.setup.sample(self.venues, max(1, num_venues // 5))
+        #filtered in one pass, as removing them one at a time is quadratic in the number of venues
+        reserved = set(self.reserve_venues)
+        self.venues = [venue for venue in self.venues if venue not in reserved]
+
+        self.population = None
+        if population == "arrays":
+            self.population = Population(num_events, initial_strategy, self.venues + self.reserve_venues, self.rng, self.log)
+            self.organizations = PopulationViews(self.population)
+
+        #"objects" keeps occupancy only in each Venue's time slot lists
+        #"array" additionally mirrors it in a venues x time slots matrix so availability and cancellations are array operations
+        self.engine = engine
+        self.grid = OccupancyGrid(self.venues, self.time_slots) if engine == "array" else None
+
+        #free venues per time slot, kept up to date by the venues, so booking picks a venue without scanning them all
+        self.venue_index = FreeVenueIndex(self.venues)
+
+        #free reserve venues per time slot, in the order the reserve phase hands them out
+        self.reserve_queue = ReserveQueue(self.reserve_venues)
+        #scheduled slots per time slot left without any venue at the end of a round, over the current run (only slots with any)
+        self.unmet_demand = {}
+
+        #"sequential" lets each organization book in turn; "batch" collects the round's demand and clears each time slot
+        #in one pass (see allocation.py), across allocation_workers processes
+        self.allocation = allocation
+        self.allocation_workers = allocation_workers
+
+        #running per-strategy payoff statistics, switch counts and gains; with keep_history=False they are all a run keeps,
+        #and the score/strategy histories hold no organizations and round_scores stay empty
+        self.keep_history = keep_history
+        history_names = [org.name for org in self.organizations] if keep_history else []
+        self.score_history = {name: [] for name in history_names}  # Store scores for each organization
+        self.strategy_history = {name: [] for name in history_names}  # Store strategies for each organization
+        self.strategy_stats = StrategyStats(len(self.organizations))
 
         self.enable_mechanism = enable_mechanism  #for the venue sharing mechanism that is toggled for comparison
 
+        #check for a Nash equilibrium every nash_interval rounds (0 disables the check),
+        #replaying the counterfactuals across nash_workers processes
+        self.nash_interval = nash_interval
+        self.nash_workers = nash_workers
+        self.nash_results = []
+
+        #worker process pools by use ("nash", "allocation"), started on first use and kept until the end of run()
+        self.pools = {}
+
+        #arm of run_simulations in progress ("without"/"with" the mechanism), rounds played in it and the results of finished arms,
+        #all saved with the checkpoints so a resumed run_simulations carries on where it stopped
+        self.arm = None
+        self.current_period = 0
+        self.arm_results = {}
+
+        #optional early stop once the strategy profile and reputation distribution have been stationary within
+        #stop_tolerance for stop_window rounds (None runs all num_periods rounds); stop records why and when the run ended
+        self.stop_tolerance = stop_tolerance
+        self.stop_window = stop_window
+        self.convergence = ConvergenceMonitor(stop_tolerance, stop_window) if stop_tolerance is not None else None
+        self.stop = None
+
+        #optional Checkpointer that saves the state every few rounds and on SIGTERM
+        self.checkpoint = checkpoint
+        if checkpoint is not None:
+            checkpoint.start()
+
+        #directory the per-run plots are rendered to (None skips plotting)
+        self.report_dir = report_dir
+
+        #optional per-phase wall times and booking counters for each run
+        self.profile = RunProfile() if profile else None
+        if self.profile is not None:
+            self.attach(profile=self.profile)
+
+        #optional TraceRecorder that streams every booking decision to disk
+        self.trace = trace
+        if trace is not None:
+            trace.bind(self)
+            self.attach(trace=trace)
+
+        #optional metric_cube.CubeWriter that stores every organization's end-of-round state
+        self.cube = cube
+
+        #optional listener told at the end of every round through round_finished(simulation), like the checkpointer;
+        #the service streams progress from it and stops cancelled jobs by raising there
+        self.progress = progress
+
+
+    def attach(self, **outputs):
+        #point every organization at the simulation's trace, profile or log; a population shares one of each
+        for name, value in outputs.items():
+            if self.population is not None:
+                setattr(self.population, name, value)
+            else:
+                for org in self.organizations:
+                    setattr(org, name, value)
 
     def generate_schedules(self):
-
-        for organization in self.organizations:
-            organization.schedule = set()
-
-            while len(organization.schedule) < organization.num_events:
-                slot = random.choice(self.time_slots)
-                is_compatible = True
-                for booked_slot in organization.schedule:
-                    if abs(booked_slot - slot) < 2:
-                        is_compatible = False
-                        break
-
-                if is_compatible:
-                    organization.schedule.add(slot)
-            print(f"Organization {organization.name} has a schedule of: {organization.schedule}")
+        #every organization's schedule is drawn in one batch; events are at least two hours apart (across days too) and in chronological order,
+        #so bookings are made in the same order in every copy of the state
+        if self.population is not None:
+            self.population.set_schedules(*sample_schedule_arrays(self.population.num_events, self.time_slots, self.rng.schedules, self.calendar.min_gap))
+            if self.log.enabled(BOOKING):
+                for organization in self.organizations:
+                    self.log.emit(BOOKING, "schedule", "Organization {org} has a schedule of: {schedule}", org=organization.name, schedule=organization.schedule)
+            return
+        schedules = sample_schedules([org.num_events for org in self.organizations], self.time_slots, self.rng.schedules, self.calendar.min_gap)
+        for organization, schedule in zip(self.organizations, schedules):
+            organization.schedule = schedule
+            self.log.emit(BOOKING, "schedule", "Organization {org} has a schedule of: {schedule}", org=organization.name, schedule=organization.schedule)
 
     def reset_venues(self):
-        print("Resetting venues for the current period")
+        self.log.emit(ROUND, "phase", "Resetting venues for the current period", phase="reset_venues")
         for venue in self.venues + self.reserve_venues:
             venue.reset_venue_bookings()
     
     def organization_bookings(self):
-        print("Organizations are booking venues")
+        self.log.emit(ROUND, "phase", "Organizations are booking venues", phase="organization_bookings")
+
+        if self.allocation == "batch":
+            self.batch_bookings()
+            return
 
         # Sort organizations by reputation (highest first)
-        for org in sorted(self.organizations, key=lambda x: x.reputation, reverse=True):
+        for org in self.organizations_by_reputation():
             # For each time slot in the organization's schedule
-            org.book_venues(self.venues, enable_mechanism=self.enable_mechanism)
+            org.book_venues(self.venues, enable_mechanism=self.enable_mechanism, index=self.venue_index)
                 
 
+    def batch_bookings(self):
+        #demand per slot in reputation order: each organization's share of its budget and how many venues it wants
+        venue_positions = {venue: i for i, venue in enumerate(self.venues)}
+        demand = {}
+        for org_position in self.reputation_order():
+            org = self.organizations[org_position]
+            if org.budget <= 5:
+                self.log.emit(BOOKING, "insufficient_budget", "{org} has insufficient budget to book any venue.", org=org.name)
+                if self.profile is not None:
+                    self.profile.count("budget_rejections", len(org.schedule))
+                continue
+            wanted = 2 if org.strategy == "overbook" else 1
+            for slot, allowance in zip(org.schedule, split_budget(org.budget, len(org.schedule))):
+                demand.setdefault(slot, []).append((org_position, allowance, wanted))
+
+        #one seed per round from the venue choice stream; each slot gets its own substream, so the outcome
+        #does not depend on how the slots are spread over workers
+        round_seed = self.rng.venue_choice.getrandbits(64)
+        slots = sorted(demand)
+        tasks = []
+        for slot_index, slot in enumerate(slots):
+            free = self.venue_index.free_lists(slot, self.enable_mechanism)
+            #room left in venues with a sharing capacity, which leave the slot once full
+            room = None
+            if self.enable_mechanism and self.sharing_capacity is not None:
+                room = {venue_positions[v]: v.capacity - v.occupancy(slot) for bucket in free.values() for v in bucket if v.capacity is not None}
+            tasks.append((demand[slot], {level: [venue_positions[v] for v in bucket] for level, bucket in free.items()}, (round_seed << 32) + slot_index,
+                          self.enable_mechanism, room))
+
+        if self.allocation_workers > 1 and len(tasks) > 1:
+            #one chunk of slots per worker keeps the messages to the pool down to a few per round
+            chunksize = -(-len(tasks) // self.allocation_workers)
+            cleared = list(self.worker_pool("allocation", self.allocation_workers).map(clear_slot, *zip(*tasks), chunksize=chunksize))
+        else:
+            cleared = [clear_slot(*task) for task in tasks]
+
+        for slot, (allocations, rejections) in zip(slots, cleared):
+            for org_position, venue_position, _, overbooked in allocations:
+                self.organizations[org_position].book_allocated(self.venues[venue_position], slot, self.enable_mechanism, overbooked)
+            for org_position, reason in rejections:
+                org = self.organizations[org_position]
+                if reason == "no_venue":
+                    self.log.emit(BOOKING, "no_venue", "{org} could not find any available venues for time slot {slot}.", org=org.name, slot=slot)
+                else:
+                    self.log.emit(BOOKING, "budget_rejected", "{org} cannot afford any available venue at time slot {slot}.", org=org.name, slot=slot)
+                    if self.profile is not None:
+                        self.profile.count("budget_rejections")
+
+    def reputation_order(self):
+        #organization indices from highest to lowest reputation, ties in organization order
+        if self.population is not None:
+            return self.population.by_reputation().tolist()
+        return sorted(range(len(self.organizations)), key=lambda i: self.organizations[i].reputation, reverse=True)
+
+    def organizations_by_reputation(self):
+        return [self.organizations[i] for i in self.reputation_order()]
+
+    def unbooked_events(self, order):
+        #(organization, time slot) of every scheduled slot still without a venue, for the organizations in order
+        #(indices) and each organization's slots in schedule order
+        if self.population is not None:
+            orgs, slots = self.population.unbooked(order)
+            return [(self.organizations[i], slot) for i, slot in zip(orgs.tolist(), slots.tolist())]
+        unbooked = []
+        for i in order:
+            org = self.organizations[i]
+            #the booking ledger holds the slots this organization already has a venue for
+            unbooked.extend((org, time_slot) for time_slot in org.schedule if time_slot not in org.bookings)
+        return unbooked
+
     def university_cancellations(self):
-        print("University is cancelling bookings based on cancellation rate")
+        self.log.emit(ROUND, "phase", "University is cancelling bookings based on cancellation rate", phase="university_cancellations")
+        if self.grid is not None:
+            for venue, slot in self.grid.cancellation_draws(self.cancellation_rate, self.rng.cancellations_array):
+                self.cancel_booking(venue, slot)
+            return
+
         for venue in self.venues:
-            for slot in venue.time_slots:
-                if venue.time_slots[slot] and random.random() < self.cancellation_rate:
-                    venue.cancel_booking(slot)
-                    print(f"University has cancelled booking for venue {venue.name} at time slot {slot}.")
+            #only booked slots are stored; they are visited in calendar order
+            for slot in sorted(venue.time_slots):
+                if self.rng.cancellations.random() < self.cancellation_rate:
+                    self.cancel_booking(venue, slot)
+
+    def cancel_booking(self, venue, slot):
+        if self.trace is not None:
+            for org in venue.time_slots[slot]:
+                self.trace.record(CANCEL, org, venue, slot)
+        if self.profile is not None:
+            self.profile.count("cancellations")
+        venue.cancel_booking(slot)
+        self.log.emit(BOOKING, "cancelled", "University has cancelled booking for venue {venue} at time slot {slot}.", venue=venue.name, slot=slot)
 
     #give the organizations that have not booked a venue a reserve venue so they can still host events
     def allocate_reserve_venues(self):
-        print("Allocating reserve venues to organizations...")
-        for org in sorted(self.organizations, key=lambda x: x.reputation, reverse=True):
-            for time_slot in org.schedule:
-                booked = any(org in venue.time_slots.get(time_slot, []) for venue in self.venues + self.reserve_venues)
-                if not booked:
-                    for reserve_venue in self.reserve_venues:
-                        if reserve_venue.is_available(time_slot):
-                            reserve_venue.book(org, time_slot)
-                            print(f"{org.name} has been allocated reserve venue {reserve_venue.name} for time slot {time_slot}.")
-                            break
+        self.log.emit(ROUND, "phase", "Allocating reserve venues to organizations...", phase="allocate_reserve_venues")
+        #a booking only covers its own slot, so the slots without a venue can all be listed up front
+        for org, time_slot in self.unbooked_events(self.reputation_order()):
+            reserve_venue = self.reserve_queue.first(time_slot)
+            if reserve_venue is None:
+                continue
+            reserve_venue.book(org, time_slot)
+            if self.trace is not None:
+                self.trace.record(RESERVE, org, reserve_venue, time_slot)
+            if self.profile is not None:
+                self.profile.count("reserve_allocations")
+            self.log.emit(BOOKING, "reserve", "{org} has been allocated reserve venue {venue} for time slot {slot}.", org=org.name, venue=reserve_venue.name, slot=time_slot)
     
     def apply_mechanism(self):
         if self.enable_mechanism:
-            for org in self.organizations:
-                for time_slot in org.schedule:
-                    # Check if the organization already has a booking for this time slot
-                    has_booking = any(
-                        org in venue.time_slots.get(time_slot, []) for venue in self.venues + self.reserve_venues
-                    )
-                    if has_booking:
-                        continue  # Skip, already has a booking for this time slot
-
-                    # If not, try to book an available venue
-                    available_venues = [v for v in self.venues if v.is_available(time_slot, enable_mechanism=True)]
-                    if available_venues:
-                        chosen_venue = random.choice(available_venues)
-                        chosen_venue.book(org, time_slot, enable_mechanism=True)
-                        print(f"{org.name} shared venue {chosen_venue.name} for time slot {time_slot} under the mechanism.")
+            # Only the slots an organization has no booking for yet, in organization order
+            for org, time_slot in self.unbooked_events(range(len(self.organizations))):
+                # Try to book a venue that still has room to share in this slot
+                chosen_venue = self.venue_index.choose(time_slot, self.rng.venue_choice, enable_mechanism=True)
+                if chosen_venue is None:
+                    self.log.emit(BOOKING, "no_shared_venue", "{org} found no venue with room to share at time slot {slot}.", org=org.name, slot=time_slot)
+                else:
+                    chosen_venue.book(org, time_slot, enable_mechanism=True)
+                    if self.trace is not None:
+                        self.trace.record(SHARE, org, chosen_venue, time_slot)
+                    if self.profile is not None:
+                        self.profile.count("shared_bookings")
+                    self.log.emit(BOOKING, "shared", "{org} shared venue {venue} for time slot {slot} under the mechanism.", org=org.name, venue=chosen_venue.name, slot=time_slot)
 
 
 
-    def check_nash_equilibrium(self):
-        print("Checking for Nash Equilibrium...")
-        equilibrium = True
-        for org in self.organizations:
-            original_strategy = org.strategy
-            original_score = org.score
-            # Hypothetical switch
-            org.strategy = "overbook" if original_strategy == "normal" else "normal"
-            org.score = 0  # Reset score for hypothetical scenario
-            self.reset_venues()
-            org.book_venues(self.venues, enable_mechanism=self.enable_mechanism)
-            hypothetical_score = org.score
-            # Compare scores
-            if hypothetical_score > original_score:
-                equilibrium = False
-                print(f"{org.name} has an incentive to deviate from {original_strategy}.")
-            # Revert changes
-            org.strategy = original_strategy
-            org.score = original_score
+    #scheduled slots still without any venue once reserve allocation and, in the mechanism arm, sharing have run
+    def count_unmet_demand(self):
+        if self.population is not None:
+            _, slots = self.population.unbooked(np.arange(self.population.size))
+            counts = np.unique(slots, return_counts=True)
+            unmet = dict(zip(*(values.tolist() for values in counts)))
+        else:
+            unmet = {}
+            for org in self.organizations:
+                for time_slot in org.schedule:
+                    if time_slot not in org.bookings:
+                        unmet[time_slot] = unmet.get(time_slot, 0) + 1
+        if unmet:
+            for time_slot, count in unmet.items():
+                self.unmet_demand[time_slot] = self.unmet_demand.get(time_slot, 0) + count
+            if self.profile is not None:
+                self.profile.count("unmet_demand", sum(unmet.values()))
+            self.log.emit(ROUND, "unmet_demand", "Organizations left without a venue per time slot: {slots}",
+                          slots={slot: unmet[slot] for slot in sorted(unmet)})
+
+    #copy of the current state that can be replayed without touching the live simulation:
+    #organizations, venues, reserve venues, occupancy grid and random streams are duplicated,
+    #while the event log is silenced, the trace, profile, cube and progress listener detached and the per-run histories start empty
+    def snapshot(self):
+        memo = {
+            id(self.log): EventLog(OFF),
+            id(self.score_history): {name: [] for name in self.score_history},
+            id(self.strategy_history): {name: [] for name in self.strategy_history},
+            id(self.nash_results): [],
+            id(self.pools): {},
+        }
+        if self.trace is not None:
+            memo[id(self.trace)] = None
+        if self.profile is not None:
+            memo[id(self.profile)] = None
+        if self.checkpoint is not None:
+            memo[id(self.checkpoint)] = None
+        if self.cube is not None:
+            memo[id(self.cube)] = None
+        if self.progress is not None:
+            memo[id(self.progress)] = None
+        if self.population is not None:
+            memo[id(self.population.round_scores)] = []
+        else:
+            for org in self.organizations:
+                memo[id(org.round_scores)] = []
+        #last round's bookings link every organization and venue into chains too deep for deepcopy; the round about to be
+        #played clears them first thing (reset_venues), so they are cleared here, in the live state as well, instead
+        for venue in self.venues + self.reserve_venues:
+            venue.reset_venue_bookings()
+        fork = copy.deepcopy(self, memo)
+        #forks replay a single round each, often inside a worker already, so they clear their slots serially
+        fork.allocation_workers = 1
+        return fork
+
+    def check_nash_equilibrium(self, snapshot):
+        #snapshot is the state taken at the start of the round, before any bookings were made.
+        #Each organization's unilateral switch of strategy is replayed through booking, cancellation,
+        #reserve allocation, the mechanism and scoring in its own fork of that state and compared to the payoff it actually got.
+        self.log.emit(ROUND, "phase", "Checking for Nash Equilibrium...", phase="check_nash_equilibrium")
+        org_indices = list(range(len(self.organizations)))
+        if self.nash_workers > 1 and len(org_indices) > 1:
+            chunks = [org_indices[i::self.nash_workers] for i in range(self.nash_workers)]
+            pool = self.worker_pool("nash", self.nash_workers)
+            deviation_payoffs = {}
+            for chunk_payoffs in pool.map(deviation_payoffs_for, [snapshot] * len(chunks), chunks):
+                deviation_payoffs.update(chunk_payoffs)
+        else:
+            deviation_payoffs = deviation_payoffs_for(snapshot, org_indices)
+
+        deviating = []
+        for index, org in enumerate(self.organizations):
+            # Compare the payoff from deviating with the payoff actually received this round
+            if deviation_payoffs[index] > org.current_round_score:
+                deviating.append(org.name)
+                self.log.emit(BOOKING, "deviation", "{org} has an incentive to deviate from {strategy}.", org=org.name, strategy=snapshot.organizations[index].strategy)
+        equilibrium = not deviating
+        self.nash_results.append({"round": self.log.round, "equilibrium": equilibrium, "deviating": deviating})
         if equilibrium:
-            print("Nash Equilibrium found: No organization has an incentive to deviate.")
+            self.log.emit(ROUND, "nash", "Nash Equilibrium found: No organization has an incentive to deviate.", equilibrium=True)
         else:
-            print("Current profile is not a Nash Equilibrium.")
+            self.log.emit(ROUND, "nash", "Current profile is not a Nash Equilibrium.", equilibrium=False)
+
+    def worker_pool(self, name, workers):
+        #a pool started once per run instead of once per round, so rounds do not pay for starting processes
+        pool = self.pools.get(name)
+        if pool is None:
+            pool = self.pools[name] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+    def close_pools(self):
+        for pool in self.pools.values():
+            pool.shutdown()
+        self.pools = {}
 
     def score_organizations(self):
-        print("Scoring organizations...")
+        self.log.emit(ROUND, "phase", "Scoring organizations...", phase="score_organizations")
+
+        if self.population is not None:
+            self.score_population()
+            return
 
+        strategies = []
+        payoffs = []
         for org in self.organizations:
-            bookings_per_time_slot = {}
-            for venue in self.venues + self.reserve_venues:
-                for slot, booked_orgs in venue.time_slots.items():
-                    if org in booked_orgs:
-                        if slot in bookings_per_time_slot:
-                            bookings_per_time_slot[slot].append(venue)
-                        else:
-                            bookings_per_time_slot[slot] = [venue]
-
-            unused_bookings = 0
-            successful_bookings = []
-
-            for slot in org.schedule:
-                if slot in bookings_per_time_slot:
-                    venues_booked = bookings_per_time_slot[slot]
-                    # Choose one venue as the utilized booking (e.g., the one with highest popularity)
-                    utilized_venue = max(venues_booked, key=lambda v: v.popularity_level)
-                    successful_bookings.append((utilized_venue, slot))
-                    # The rest are unused overbooked venues
-                    unused_overbooked = len(venues_booked) - 1
-                    unused_bookings += unused_overbooked
-                else:
-                    # No booking made for this scheduled event
-                    unused_bookings += 1
+            successful_bookings, unused_bookings = self.tally_bookings(org)
 
             # Increment total counts
             org.total_unused_bookings += unused_bookings
@@ -169,267 +454,396 @@ class Simulation:
 
             org.score += payoff
 
-            revenue = sum(v.popularity_level * 5 for v, _ in successful_bookings)
+            revenue = sum(v.popularity_level * Organization.COST_PER_LEVEL for v, _ in successful_bookings)
             org.budget += revenue
 
-            org.round_scores.append((org.strategy, payoff))  # Store strategy and payoff for this round
-
-            self.score_history[org.name].append(org.score)
-            print(f"{org.name}: Successful bookings = {len(successful_bookings)}, Unused bookings = {unused_bookings}")
-            print(f"Payoff: {payoff}, Updated score: {org.score}, Reputation: {org.reputation:.2f}")
-
+            strategies.append(STRATEGY_CODES[org.strategy])
+            payoffs.append(payoff)
+            if self.keep_history:
+                org.round_scores.append((org.strategy, payoff))  # Store strategy and payoff for this round
+                self.score_history[org.name].append(org.score)
+            self.log.emit(BOOKING, "score", "{org}: Successful bookings = {successful}, Unused bookings = {unused}\nPayoff: {payoff}, Updated score: {score}, Reputation: {reputation:.2f}",
+                          org=org.name, successful=len(successful_bookings), unused=unused_bookings, payoff=payoff, score=org.score, reputation=org.reputation)
+        self.strategy_stats.record_round(strategies, payoffs)
+
+    def tally_bookings(self, org):
+        #the booking ledger already groups this organization's venues by time slot
+        bookings_per_time_slot = org.bookings
+
+        unused_bookings = 0
+        successful_bookings = []
+
+        for slot in org.schedule:
+            if slot in bookings_per_time_slot:
+                venues_booked = bookings_per_time_slot[slot]
+                # Choose one venue as the utilized booking (e.g., the one with highest popularity)
+                utilized_venue = max(venues_booked, key=lambda v: v.popularity_level)
+                successful_bookings.append((utilized_venue, slot))
+                # The rest are unused overbooked venues
+                unused_overbooked = len(venues_booked) - 1
+                unused_bookings += unused_overbooked
+            else:
+                # No booking made for this scheduled event
+                unused_bookings += 1
+
+        return successful_bookings, unused_bookings
+
+    #scoring for the array population: bookings are tallied from the booking ledger, then penalties, payoffs,
+    #scores, budgets and booking totals are updated for the whole population in one go
+    def score_population(self):
+        popularity_sum, successful, unused = self.population.tally_bookings()
+        payoff = self.population.score_round(popularity_sum, successful, unused)
+
+        strategies = self.population.strategy
+        self.strategy_stats.record_round(strategies, payoff)
+        if self.keep_history:
+            self.population.round_scores.append((strategies.copy(), payoff))  # Store strategies and payoffs for this round
+            for history, score in zip(self.score_history.values(), self.population.score.tolist()):
+                history.append(score)
+        if self.log.enabled(BOOKING):
+            for i, org in enumerate(self.organizations):
+                self.log.emit(BOOKING, "penalty", "{org} has a penalty cost of {penalty_cost} due to {unused} unused venues.", org=org.name, penalty_cost=org.penalty_cost, unused=int(unused[i]))
+                self.log.emit(BOOKING, "score", "{org}: Successful bookings = {successful}, Unused bookings = {unused}\nPayoff: {payoff}, Updated score: {score}, Reputation: {reputation:.2f}",
+                              org=org.name, successful=int(successful[i]), unused=int(unused[i]), payoff=float(payoff[i]), score=org.score, reputation=org.reputation)
 
     def get_average_score(self):
+        if self.population is not None:
+            return float(self.population.current_round_score.mean())
         return sum(org.current_round_score for org in self.organizations) / len(self.organizations)
     
 
     def update_reputations(self):
         avg_score = self.get_average_score()
-        print(f"Average score is {avg_score}")
-        print("Updating reputations...")
+        self.log.emit(ROUND, "average_score", "Average score is {average_score}", average_score=avg_score)
+        self.log.emit(ROUND, "phase", "Updating reputations...", phase="update_reputations")
+        if self.population is not None:
+            changes = self.population.update_reputation(avg_score)
+            if self.log.enabled(BOOKING):
+                for org, change in zip(self.organizations, changes):
+                    self.log.emit(BOOKING, "reputation", "{org} changed reputation by {change:.2f}.", org=org.name, change=float(change))
+                    self.log.emit(BOOKING, "reputation_total", "Organization {org} has a reputation of {reputation}", org=org.name, reputation=org.reputation)
+            return
         for org in self.organizations:
             org.update_reputation(avg_score)
-            print(f"Organization {org.name} has a reputation of {org.reputation}")
+            self.log.emit(BOOKING, "reputation_total", "Organization {org} has a reputation of {reputation}", org=org.name, reputation=org.reputation)
 
 
     def update_strategies(self):
         avg_score = self.get_average_score()
+        if self.population is not None:
+            if self.keep_history:
+                for history, code in zip(self.strategy_history.values(), self.population.strategy.tolist()):
+                    history.append(STRATEGIES[code])  # Track strategy each round
+            self.population.update_strategy(avg_score, self.rng.strategy_array)
+            if self.log.enabled(BOOKING):
+                for org in self.organizations:
+                    self.log.emit(BOOKING, "strategy_total", "Organization {org} has a strategy of {strategy} after the round", org=org.name, strategy=org.strategy)
+            return
         for org in self.organizations:
-            self.strategy_history[org.name].append(org.strategy)  # Track strategy each round
+            if self.keep_history:
+                self.strategy_history[org.name].append(org.strategy)  # Track strategy each round
             org.update_strategy(avg_score)
-            print(f"Organization {org.name} has a strategy of {org.strategy} after the round")
+            self.log.emit(BOOKING, "strategy_total", "Organization {org} has a strategy of {strategy} after the round", org=org.name, strategy=org.strategy)
 
     def run(self):
-        for period in range(self.num_periods):
+        try:
+            self.play_rounds()
+        finally:
+            self.close_pools()
+
+    def play_rounds(self):
+        if self.trace is not None:
+            self.trace.start_run(self.enable_mechanism)
+        #carries on from current_period, which is past 0 when resuming from a checkpoint
+        while self.current_period < self.num_periods and self.stop is None:
+            period = self.current_period
 
             #Added in time.sleep to actually be able to track what is going on as the simulation is running
 
-            print(f"\n==== Round {period + 1} ====")
-            print("Organizations are either overbooking or booking regularly based on their strategy")
+            self.log.round = period + 1
+            if self.trace is not None:
+                self.trace.start_round(period + 1)
+            if self.profile is not None:
+                self.profile.start_round(period + 1)
+            self.log.emit(ROUND, "round", "\n==== Round {round} ====\nOrganizations are either overbooking or booking regularly based on their strategy", round=period + 1)
 
 
-            self.generate_schedules()
+            self.run_phase("generate_schedules", self.generate_schedules)
+            if self.trace is not None:
+                for org in self.organizations:
+                    self.trace.record_strategy(org, STRATEGY_CODES[org.strategy])
+                    for slot in org.schedule:
+                        self.trace.record(SCHEDULE, org, None, slot)
 
+            #keep the start-of-round state so the Nash check can replay deviations from it
+            check_nash = self.nash_interval > 0 and (period + 1) % self.nash_interval == 0
+            round_start = self.run_phase("snapshot", self.snapshot) if check_nash else None
 
-            self.reset_venues()
+            self.play_round()
+            if self.log.enabled(ROUND):
+                self.log.emit(ROUND, "strategy_stats", "Running average payoff: normal {normal:.2f}, overbook {overbook:.2f}",
+                              **{strategy: self.strategy_stats.average(strategy) for strategy in STRATEGIES})
 
-            #process the bookings for the current period
-            self.organization_bookings()
+            #update the reputations and strategies of the organizations
+            self.run_phase("update_reputations", self.update_reputations)
+            if self.cube is not None:
+                #recorded before update_strategies so the strategy is the one the round was played with
+                self.cube.record_round(int(self.enable_mechanism), period, self.organization_state())
+
+            self.run_phase("update_strategies", self.update_strategies)
+
+            if check_nash:
+                self.run_phase("check_nash_equilibrium", self.check_nash_equilibrium, round_start)
+
+            self.current_period += 1
+            if self.convergence is not None and self.convergence.observe(*self.strategy_profile()):
+                self.stop = {"reason": "converged", "round": self.current_period}
+                self.log.emit(SUMMARY, "stopped", "\nStopped after round {round} of {num_periods}: strategy profile and reputations stationary within {tolerance} for {window} rounds.",
+                              round=self.current_period, num_periods=self.num_periods, tolerance=self.stop_tolerance, window=self.stop_window,
+                              reason="converged", strategy_shift=self.convergence.strategy_shift, reputation_shift=self.convergence.reputation_shift)
+            if self.progress is not None:
+                self.progress.round_finished(self)
+            if self.checkpoint is not None:
+                self.checkpoint.round_finished(self)
+        if self.stop is None:
+            self.stop = {"reason": "num_periods", "round": self.current_period}
+
+    def organization_state(self):
+        #score, reputation, budget, strategy code and booking totals of every organization, one value each per field
+        if self.population is not None:
+            population = self.population
+            return {"score": population.score, "reputation": population.reputation, "budget": population.budget, "strategy": population.strategy,
+                    "successful_bookings": population.total_successful_bookings, "unused_bookings": population.total_unused_bookings}
+        orgs = self.organizations
+        return {
+            "score": [org.score for org in orgs],
+            "reputation": [org.reputation for org in orgs],
+            "budget": [org.budget for org in orgs],
+            "strategy": [STRATEGY_CODES[org.strategy] for org in orgs],
+            "successful_bookings": [org.total_successful_bookings for org in orgs],
+            "unused_bookings": [org.total_unused_bookings for org in orgs],
+        }
 
-            #cancel the bookings for the current period
-            self.university_cancellations()
+    def strategy_profile(self):
+        #strategy codes and reputations of every organization, as the convergence check compares them between rounds
+        if self.population is not None:
+            return self.population.strategy, self.population.reputation
+        return [STRATEGY_CODES[org.strategy] for org in self.organizations], [org.reputation for org in self.organizations]
 
-            #allocate reserve venues to organizations that have not booked a venue
-            self.allocate_reserve_venues()
+    #booking, cancellation, reserve and scoring phases of one round, shared by run() and the Nash check's forks
+    def play_round(self):
+        self.run_phase("reset_venues", self.reset_venues)
 
-            self.apply_mechanism()
+        #process the bookings for the current period
+        self.run_phase("organization_bookings", self.organization_bookings)
 
-            #score the organizations based on their bookings
-            self.score_organizations()
+        #cancel the bookings for the current period
+        self.run_phase("university_cancellations", self.university_cancellations)
 
-            #update the reputations and strategies of the organizations
-            self.update_reputations()
+        #allocate reserve venues to organizations that have not booked a venue
+        self.run_phase("allocate_reserve_venues", self.allocate_reserve_venues)
 
-            self.update_strategies()
+        self.run_phase("apply_mechanism", self.apply_mechanism)
 
-            self.check_nash_equilibrium()
+        #count the scheduled slots that ended up without a venue
+        self.run_phase("count_unmet_demand", self.count_unmet_demand)
+
+        #score the organizations based on their bookings
+        self.run_phase("score_organizations", self.score_organizations)
+
+    def run_phase(self, name, phase, *args):
+        if self.profile is None:
+            return phase(*args)
+        return self.profile.time_phase(name, phase, *args)
     
     def print_results(self):
-        print("\nSimulation Results:")
-        print("-------------------")
+        self.log.emit(SUMMARY, "results_header", "\nSimulation Results:\n-------------------")
         for org in sorted(self.organizations, key=lambda x: x.score, reverse=True):
             successful_bookings = org.total_successful_bookings
             unused_bookings = org.total_unused_bookings
 
-            print(f"{org.name}:")
-            print(f"  Strategy: {org.strategy}")
-            print(f"  Score: {org.score:.2f}")
-            print(f"  Reputation: {org.reputation:.2f}")
-            print(f"  Successful Bookings: {successful_bookings}")
-            print(f"  Unused Bookings: {unused_bookings}")
-        print("\nStrategy Performance:")
+            self.log.emit(SUMMARY, "org_result", "{org}:\n  Strategy: {strategy}\n  Score: {score:.2f}\n  Reputation: {reputation:.2f}\n  Successful Bookings: {successful}\n  Unused Bookings: {unused}",
+                          org=org.name, strategy=org.strategy, score=org.score, reputation=org.reputation, successful=successful_bookings, unused=unused_bookings)
+        unmet = {slot: self.unmet_demand[slot] for slot in sorted(self.unmet_demand)}
+        if unmet:
+            self.log.emit(SUMMARY, "unmet_demand", "Scheduled slots left without a venue after reserve allocation and sharing, per time slot: {slots}", slots=unmet)
+        self.log.emit(SUMMARY, "results_footer", "\nStrategy Performance:")
+
+    def print_profile(self):
+        if self.profile is None:
+            return
+        report = self.profile.report()
+        self.log.emit(SUMMARY, "profile_header", "\nRun Profile ({rounds} rounds, {seconds:.3f} s):", rounds=report['rounds'], seconds=report['total_seconds'])
+        for phase, seconds in report['phase_seconds'].items():
+            self.log.emit(SUMMARY, "profile_phase", "  {phase}: {seconds:.3f} s", phase=phase, seconds=seconds)
+        for counter, amount in report['counters'].items():
+            self.log.emit(SUMMARY, "profile_counter", "  {counter}: {amount}", counter=counter, amount=amount)
+
+    def arm_label(self):
+        return "with_mechanism" if self.enable_mechanism else "without_mechanism"
+
+    def strategy_averages(self):
+        return {strategy: self.strategy_stats.average(strategy) for strategy in STRATEGIES}
+
+    def report_data(self, label=None):
+        #plain picklable snapshot of what the reports draw, so worker processes can hand runs back for batch rendering
+        names = [org.name for org in self.organizations]
+        return {
+            "label": label or self.arm_label(),
+            "names": names,
+            "scores": [list(self.score_history.get(name, [])) for name in names],
+            "strategies": [list(self.strategy_history.get(name, [])) for name in names],
+            "strategy_averages": self.strategy_averages(),
+        }
 
     def plot_results(self):
+        if self.report_dir is None:
+            return
+        path = reporting.render_scores(self.report_data(), os.path.join(self.report_dir, f"scores_{self.arm_label()}.png"))
+        self.log.emit(SUMMARY, "plotting", "\nPlotted results to {path}", path=path)
 
-        print("\nPlotting Results...")
-
-        rounds = range(1, self.num_periods + 1)
-        org_names = [org.name for org in self.organizations]
-        num_orgs = len(org_names)
-        colors = cm.get_cmap('tab10', num_orgs)  # Get a color map with enough colors
-
-        # Define markers for strategies
-        strategy_markers = {"normal": "o", "overbook": "s"}  # Circle for normal, square for overbook
-
-        plt.figure(figsize=(12, 6))
-
-        for idx, org in enumerate(self.organizations):
-            scores = self.score_history[org.name]
-            strategies = self.strategy_history[org.name]
-            color = colors(idx)
-            marker_style = [strategy_markers[strat] for strat in strategies]
-
-            # Plot the score over rounds with markers indicating strategy
-            for i in range(len(scores)):
-                plt.plot(rounds[i], scores[i], marker=marker_style[i], color=color, markersize=8, linestyle='-')
-                if i > 0:
-                    plt.plot(rounds[i-1:i+1], scores[i-1:i+1], color=color, linestyle='-')
-
-        # Create custom legend entries for organizations
-        org_legend = [Line2D([0], [0], color=colors(idx), lw=2, label=org.name) for idx, org in enumerate(self.organizations)]
-
-        # Create custom legend entries for strategies
-        strategy_legend = [Line2D([0], [0], marker=marker, color='w', label=label,
-                                markerfacecolor='black', markersize=8) for label, marker in strategy_markers.items()]
-
-        plt.title("Organization Scores Over Time with Strategies")
-        plt.xlabel("Round")
-        plt.ylabel("Score")
-        plt.legend(handles=org_legend + strategy_legend, loc='upper left', bbox_to_anchor=(1, 1))
-        plt.tight_layout()
-        plt.show()
-
-
-    
     def compare_strategy_performance(self):
-        normal_scores = []
-        overbook_scores = []
-
-        for org in self.organizations:
-            for (strategy, score) in org.round_scores:
-                if strategy == 'normal':
-                    normal_scores.append(score)
-                elif strategy == 'overbook':
-                    overbook_scores.append(score)
-
-        avg_normal_score = sum(normal_scores) / len(normal_scores) if normal_scores else 0
-        avg_overbook_score = sum(overbook_scores) / len(overbook_scores) if overbook_scores else 0
+        averages = self.strategy_averages()
 
-        print(f"Average score for normal booking: {avg_normal_score:.2f}")
-        print(f"Average score for overbooking: {avg_overbook_score:.2f}")
+        self.log.emit(SUMMARY, "strategy_performance", "Average score for normal booking: {normal:.2f}\nAverage score for overbooking: {overbook:.2f}",
+                      normal=averages["normal"], overbook=averages["overbook"],
+                      normal_variance=self.strategy_stats.variance("normal"), overbook_variance=self.strategy_stats.variance("overbook"))
 
-        plt.bar(['Normal Booking', 'Overbooking'], [avg_normal_score, avg_overbook_score])
-        plt.title("Comparison of Average Scores by Strategy")
-        plt.ylabel("Average Score")
-        plt.show()
+        if self.report_dir is not None:
+            reporting.render_strategy_comparison(self.report_data(), os.path.join(self.report_dir, f"strategy_performance_{self.arm_label()}.png"))
 
     def analyze_comparison(self, results_without, results_with):
-        print("\nComparing Results:")
+        self.log.emit(SUMMARY, "comparison_header", "\nComparing Results:")
         avg_score_without = sum(results_without['scores'].values()) / len(self.organizations)
         avg_score_with = sum(results_with['scores'].values()) / len(self.organizations)
 
-        print(f"Average Score without Mechanism: {avg_score_without:.2f}")
-        print(f"Average Score with Mechanism: {avg_score_with:.2f}")
+        self.log.emit(SUMMARY, "comparison", "Average Score without Mechanism: {without:.2f}\nAverage Score with Mechanism: {with_:.2f}",
+                      metric="average_score", without=avg_score_without, with_=avg_score_with)
 
         # Compare total successful bookings
         total_bookings_without = sum(results_without['successful_bookings'].values())
         total_bookings_with = sum(results_with['successful_bookings'].values())
 
-        print(f"Total Successful Bookings without Mechanism: {total_bookings_without}")
-        print(f"Total Successful Bookings with Mechanism: {total_bookings_with}")
+        self.log.emit(SUMMARY, "comparison", "Total Successful Bookings without Mechanism: {without}\nTotal Successful Bookings with Mechanism: {with_}",
+                      metric="successful_bookings", without=total_bookings_without, with_=total_bookings_with)
 
         total_unused_without = sum(results_without['unused_bookings'].values())
         total_unused_with = sum(results_with['unused_bookings'].values())
 
-        print(f"Total Unused Bookings without Mechanism: {total_unused_without}")
-        print(f"Total Unused Bookings with Mechanism: {total_unused_with}")
+        self.log.emit(SUMMARY, "comparison", "Total Unused Bookings without Mechanism: {without}\nTotal Unused Bookings with Mechanism: {with_}",
+                      metric="unused_bookings", without=total_unused_without, with_=total_unused_with)
 
-        # Additional analyses can be added here, such as comparing Gini coefficients
-        gini_without = self.calculate_gini_coefficient_from_scores(list(results_without['scores'].values()))
-        gini_with = self.calculate_gini_coefficient_from_scores(list(results_with['scores'].values()))
+        #fairness of the final scores for both arms in one pass (row 0 without the mechanism, row 1 with it)
+        fairness = metrics.fairness([list(results_without['scores'].values()), list(results_with['scores'].values())])
+        for metric, label in (("gini", "Gini Coefficient"), ("jain", "Jain's Fairness Index"), ("theil", "Theil Index")):
+            self.log.emit(SUMMARY, "comparison", label + " without Mechanism: {without:.2f}\n" + label + " with Mechanism: {with_:.2f}",
+                          metric=metric, without=float(fairness[metric][0]), with_=float(fairness[metric][1]))
 
-        print(f"Gini Coefficient without Mechanism: {gini_without:.2f}")
-        print(f"Gini Coefficient with Mechanism: {gini_with:.2f}")
+        utilization = metrics.utilization([list(results_without['successful_bookings'].values()), list(results_with['successful_bookings'].values())],
+                                          [list(results_without['unused_bookings'].values()), list(results_with['unused_bookings'].values())])
+        self.log.emit(SUMMARY, "comparison", "Booking Utilization without Mechanism: {without:.2f}\nBooking Utilization with Mechanism: {with_:.2f}",
+                      metric="utilization", without=float(utilization[0]), with_=float(utilization[1]))
 
 
-    def analyze_strategy_impact(self):
-        print("\nAnalyzing Strategy Impact:")
-        for org in self.organizations:
-            scores = self.score_history[org.name]
-            strategies = self.strategy_history[org.name]
-            strategy_changes = 0
-            for i in range(1, len(strategies)):
-                if strategies[i] != strategies[i - 1]:
-                    strategy_changes += 1
+    def fairness_trajectory(self):
+        #fairness of the cumulative scores after every round so far, from a rounds x organizations matrix in one call
+        if not self.keep_history:
+            return {metric: [] for metric in metrics.METRICS}
+        scores = np.array([self.score_history[org.name] for org in self.organizations]).T
+        if scores.size == 0:
+            return {metric: [] for metric in metrics.METRICS}
+        return {metric: values.tolist() for metric, values in metrics.fairness(scores).items()}
 
-            total_overbook_score = sum([scores[i] - scores[i - 1] for i in range(1, len(scores)) if strategies[i] == 'overbook'])
-            total_normal_score = sum([scores[i] - scores[i - 1] for i in range(1, len(scores)) if strategies[i] == 'normal'])
-
-            print(f"{org.name}:")
-            print(f"  Strategy Changes: {strategy_changes}")
-            print(f"  Total Score Gain during Overbooking: {total_overbook_score}")
-            print(f"  Total Score Gain during Normal Booking: {total_normal_score}")
+    def analyze_strategy_impact(self):
+        self.log.emit(SUMMARY, "strategy_impact_header", "\nAnalyzing Strategy Impact:")
+        for index, org in enumerate(self.organizations):
+            self.log.emit(SUMMARY, "strategy_impact", "{org}:\n  Strategy Changes: {changes}\n  Total Score Gain during Overbooking: {overbook_gain}\n  Total Score Gain during Normal Booking: {normal_gain}",
+                          org=org.name, changes=int(self.strategy_stats.changes[index]),
+                          overbook_gain=self.strategy_stats.gain(index, "overbook"), normal_gain=self.strategy_stats.gain(index, "normal"))
 
 
     def track_strategy_changes(self):
-        strategy_changes = {org.name: 0 for org in self.organizations}
-
-        for org in self.organizations:
-            for i in range(1, len(self.strategy_history[org.name])):
-                if self.strategy_history[org.name][i] != self.strategy_history[org.name][i - 1]:
-                    strategy_changes[org.name] += 1
-
-        print("Strategy changes over time:")
-        for org_name, changes in strategy_changes.items():
-            print(f"{org_name}: {changes} changes")
+        self.log.emit(SUMMARY, "strategy_changes_header", "Strategy changes over time:")
+        for org, changes in zip(self.organizations, self.strategy_stats.changes):
+            self.log.emit(SUMMARY, "strategy_changes", "{org}: {changes} changes", org=org.name, changes=int(changes))
 
     
 
-    def calculate_gini_coefficient_from_scores(self, scores_list):
-        scores = np.array(sorted(scores_list))
-        if np.all(scores == 0):
-            return 0.0  # All scores are zero, indicating perfect equality
-        else:
-            n = len(scores)
-            sum_scores = np.sum(scores)
-            index = np.arange(1, n + 1)  # Indices from 1 to n
-            # Apply the simplified Gini coefficient formula
-            gini = (2 * np.sum(index * scores)) / (n * sum_scores) - (n + 1) / n
-            return gini
+    @staticmethod
+    def calculate_gini_coefficient_from_scores(scores_list):
+        return float(metrics.gini(scores_list))
 
     
     def run_simulations(self):
         # Run simulation without mechanism
-        print("\nRunning simulation without venue sharing mechanism...")
-        self.enable_mechanism = False
-        self.reset_simulation()
-        self.run()
-        results_without_mechanism = self.collect_results()
-        self.print_results()
-        self.plot_results()
-        self.compare_strategy_performance()
-        self.analyze_strategy_impact()
-        self.print_results()
+        if "without" not in self.arm_results:
+            self.log.emit(SUMMARY, "arm", "\nRunning simulation without venue sharing mechanism...", enable_mechanism=False)
+            self.run_arm("without")
+            self.print_results()
+            self.print_profile()
+            self.plot_results()
+            self.compare_strategy_performance()
+            self.analyze_strategy_impact()
+            self.print_results()
+        results_without_mechanism = self.arm_results["without"]
 
 
 
         # Run simulation with mechanism
-        print("\nRunning simulation with venue sharing mechanism...")
-        self.enable_mechanism = True
-        self.reset_simulation()
-        self.run()
-        results_with_mechanism = self.collect_results()
-        self.print_results()
-        self.plot_results()
-        self.compare_strategy_performance()
-        self.analyze_strategy_impact()
+        if "with" not in self.arm_results:
+            self.log.emit(SUMMARY, "arm", "\nRunning simulation with venue sharing mechanism...", enable_mechanism=True)
+            self.run_arm("with")
+            self.print_results()
+            self.print_profile()
+            self.plot_results()
+            self.compare_strategy_performance()
+            self.analyze_strategy_impact()
+        results_with_mechanism = self.arm_results["with"]
 
         # Analyze and compare the results
         self.analyze_comparison(results_without_mechanism, results_with_mechanism)
+        return results_without_mechanism, results_with_mechanism
+
+    def run_arm(self, arm):
+        #an arm that was in progress when the checkpoint was saved continues from there instead of starting over
+        if self.arm != arm:
+            self.arm = arm
+            self.enable_mechanism = arm == "with"
+            self.reset_simulation()
+        self.run()
+        self.arm_results[arm] = self.collect_results()
+        if self.checkpoint is not None:
+            self.checkpoint.save(self)
 
     def reset_simulation(self):
+        #rewind the random streams so every run of this simulation sees common random numbers
+        self.rng.reset()
+        self.current_period = 0
+        if self.profile is not None:
+            self.profile.reset()
+
         # Reset organizations
-        for org in self.organizations:
-            org.score = 0
-            org.current_round_score = 0
-            org.reputation = 100
-            org.budget = 200
-            org.penalty_cost = 1
-            org.round_scores = []
-            org.total_successful_bookings = 0
-            org.total_unused_bookings = 0
-            self.score_history[org.name] = []
-            self.strategy_history[org.name] = []
+        if self.population is not None:
+            self.population.reset()
+        else:
+            for org in self.organizations:
+                org.strategy = org.initial_strategy
+                org.score = 0
+                org.current_round_score = 0
+                org.reputation = 100
+                org.budget = 200
+                org.penalty_cost = 1
+                org.round_scores = []
+                org.total_successful_bookings = 0
+                org.total_unused_bookings = 0
+        for name in self.score_history:
+            self.score_history[name] = []
+            self.strategy_history[name] = []
+        self.nash_results = []
+        self.unmet_demand = {}
+        self.strategy_stats = StrategyStats(len(self.organizations))
+        self.convergence = ConvergenceMonitor(self.stop_tolerance, self.stop_window) if self.stop_tolerance is not None else None
+        self.stop = None
             
 
         # Reset venues
@@ -438,13 +852,42 @@ class Simulation:
 
     def collect_results(self):
         # Collect results after simulation run
+        names = [org.name for org in self.organizations]
+        if self.population is not None:
+            population = self.population
+            scores, reputations = population.score.tolist(), population.reputation.tolist()
+            successful, unused = population.total_successful_bookings.tolist(), population.total_unused_bookings.tolist()
+        else:
+            scores, reputations = [org.score for org in self.organizations], [org.reputation for org in self.organizations]
+            successful = [org.total_successful_bookings for org in self.organizations]
+            unused = [org.total_unused_bookings for org in self.organizations]
         results = {
-            'scores': {org.name: org.score for org in self.organizations},
-            'reputations': {org.name: org.reputation for org in self.organizations},
-            'strategies': {org.name: self.strategy_history[org.name] for org in self.organizations},
-            'successful_bookings': {org.name: org.total_successful_bookings for org in self.organizations},
-            'unused_bookings': {org.name: org.total_unused_bookings for org in self.organizations}
+            'scores': dict(zip(names, scores)),
+            'reputations': dict(zip(names, reputations)),
+            'strategies': {name: self.strategy_history.get(name, []) for name in names},
+            'successful_bookings': dict(zip(names, successful)),
+            'unused_bookings': dict(zip(names, unused)),
+            'unmet_demand': dict(self.unmet_demand),
+            'strategy_stats': self.strategy_stats.summary(),
+            'fairness': self.fairness_trajectory(),
+            'stop': self.stop
         }
+        if self.profile is not None:
+            results['profile'] = self.profile.report()
+        if self.report_dir is not None:
+            results['report'] = self.report_data()
         return results
 
 
+def deviation_payoffs_for(snapshot, org_indices):
+    #payoff each organization would get this round by switching strategy while everyone else keeps theirs
+    #every fork is unpickled from one serialized copy, which is several times cheaper than a deepcopy per organization
+    state = pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)
+    payoffs = {}
+    for index in org_indices:
+        fork = pickle.loads(state)
+        org = fork.organizations[index]
+        org.strategy = "overbook" if org.strategy == "normal" else "normal"
+        fork.play_round()
+        payoffs[index] = org.current_round_score
+    return payoffs
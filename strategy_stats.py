@@ -0,0 +1,57 @@
+import numpy as np
+
+from population import STRATEGIES, STRATEGY_CODES
+
+#Running strategy performance for one run, updated once per round as organizations are scored, so the figures that
+#compare_strategy_performance, analyze_strategy_impact and track_strategy_changes report are available at any round
+#without walking the round_scores and score/strategy histories (which a run may then choose not to keep at all).
+#Per strategy: number of organization-rounds played with it and the mean and variance of their payoffs, merged in a
+#round at a time with Chan et al.'s parallel form of Welford's method. Per organization: strategy switches between
+#consecutive rounds and the payoff gained under each strategy.
+class StrategyStats:
+    def __init__(self, size):
+        self.rounds = 0
+        self.count = np.zeros(len(STRATEGIES), dtype=np.int64)
+        self.mean = np.zeros(len(STRATEGIES))
+        #sum of squared deviations from the mean
+        self.m2 = np.zeros(len(STRATEGIES))
+        self.last_strategy = np.full(size, -1, dtype=np.int8)
+        self.changes = np.zeros(size, dtype=np.int64)
+        self.gains = np.zeros((size, len(STRATEGIES)))
+
+    def record_round(self, strategies, payoffs):
+        #strategies are the strategy codes each organization played this round, payoffs what it scored
+        strategies = np.asarray(strategies, dtype=np.int8)
+        payoffs = np.asarray(payoffs, dtype=float)
+        for code in range(len(STRATEGIES)):
+            batch = payoffs[strategies == code]
+            if batch.size == 0:
+                continue
+            count = self.count[code] + batch.size
+            batch_mean = batch.mean()
+            delta = batch_mean - self.mean[code]
+            self.m2[code] += ((batch - batch_mean) ** 2).sum() + delta ** 2 * self.count[code] * batch.size / count
+            self.mean[code] += delta * batch.size / count
+            self.count[code] = count
+        #gains are counted from the second round on, as the score differences in the histories always were
+        if self.rounds > 0:
+            self.changes += strategies != self.last_strategy
+            self.gains[np.arange(len(strategies)), strategies] += payoffs
+        self.last_strategy = strategies
+        self.rounds += 1
+
+    def average(self, strategy):
+        code = STRATEGY_CODES[strategy]
+        return float(self.mean[code]) if self.count[code] else 0
+
+    def variance(self, strategy):
+        #sample variance of the payoffs under this strategy
+        code = STRATEGY_CODES[strategy]
+        return float(self.m2[code] / (self.count[code] - 1)) if self.count[code] > 1 else 0.0
+
+    def summary(self):
+        return {strategy: {"count": int(self.count[code]), "mean": self.average(strategy), "variance": self.variance(strategy)}
+                for code, strategy in enumerate(STRATEGIES)}
+
+    def gain(self, index, strategy):
+        return float(self.gains[index, STRATEGY_CODES[strategy]])
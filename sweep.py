@@ -0,0 +1,190 @@
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from replication import ARMS, replicate_seeds, run_replicate, summarize_arm
+from metric_cube import create_cube
+
+DEFAULT_CACHE_DIR = ".sweep_cache"
+
+#Simulation constructor parameters a scenario may set, with the defaults used by main.py
+SCENARIO_DEFAULTS = {
+    "num_orgs": 10,
+    "num_venues": 15,
+    "num_periods": 10,
+    "cancellation_rate": 0.3,
+    "engine": "objects",
+    "population": "objects",
+    "allocation": "sequential",
+    "sharing_capacity": None,
+    "stop_tolerance": None,
+    "stop_window": 5,
+    #the Nash check replays a round per organization, so sweeps leave it off unless a scenario asks for it
+    "nash_interval": 0,
+}
+
+
+def code_version():
+    #hash of every module next to this one, so cached results are invalidated whenever the code changes
+    here = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for filename in sorted(os.listdir(here)):
+        if filename.endswith(".py"):
+            digest.update(filename.encode())
+            with open(os.path.join(here, filename), "rb") as source:
+                digest.update(source.read())
+    return digest.hexdigest()
+
+
+def expand_grid(grid):
+    #turn {"num_orgs": [10, 50], "cancellation_rate": [0.1, 0.3]} into one scenario per combination
+    keys = list(grid)
+    return [normalize_scenario(dict(zip(keys, values))) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def normalize_scenario(scenario):
+    unknown = set(scenario) - set(SCENARIO_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown scenario parameters: {sorted(unknown)}")
+    return {**SCENARIO_DEFAULTS, **scenario}
+
+
+def cache_key(scenario, seed, version):
+    payload = json.dumps({"scenario": scenario, "seed": seed, "code": version}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+#On-disk memo of replicate results, one JSON file per scenario + seed + code version
+class ResultCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, version=None):
+        self.cache_dir = cache_dir
+        self.version = version if version is not None else code_version()
+
+    def _path(self, scenario, seed):
+        key = cache_key(scenario, seed, self.version)
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, scenario, seed):
+        path = self._path(scenario, seed)
+        if not os.path.exists(path):
+            return None
+        with open(path) as cached:
+            return json.load(cached)
+
+    def put(self, scenario, seed, result):
+        path = self._path(scenario, seed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        #write to a temporary file first so an interrupted sweep never leaves a truncated entry behind
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as cached:
+            json.dump(result, cached)
+        os.replace(temp_path, path)
+
+
+def run_sweep(scenarios, replicates=1, seed=None, workers=1, cache=None, cube=None):
+    #cube is an optional path for a metric cube (see metric_cube.py) of every round of every run. The cache only holds
+    #final results, so with a cube every point is computed, its rounds written by the workers straight into the cube,
+    #and the runs keep no per-round histories of their own.
+    cache = cache if cache is not None else ResultCache()
+    scenarios = [normalize_scenario(scenario) for scenario in scenarios]
+    seeds = replicate_seeds(replicates, seed)
+    if cube is not None:
+        create_cube(cube, scenarios, seeds, max(scenario["num_periods"] for scenario in scenarios), max(scenario["num_orgs"] for scenario in scenarios))
+
+    #look everything up first and only compute the points the cache does not have
+    results = {}
+    missing = []
+    for index, scenario in enumerate(scenarios):
+        for replicate, replicate_seed in enumerate(seeds):
+            cached = cache.get(scenario, replicate_seed) if cube is None else None
+            if cached is None:
+                missing.append((index, replicate, replicate_seed))
+            else:
+                results[index, replicate] = cached
+
+    params = [dict(scenarios[index], enable_mechanism=False, keep_history=cube is None) for index, _, _ in missing]
+    job_seeds = [replicate_seed for _, _, replicate_seed in missing]
+    reports = [False] * len(missing)
+    positions = [(cube, index, replicate) if cube is not None else None for index, replicate, _ in missing]
+
+    def store(computed):
+        #results are cached as they arrive so an interrupted sweep keeps the points it finished
+        for (index, replicate, replicate_seed), result in zip(missing, computed):
+            cache.put(scenarios[index], replicate_seed, result)
+            results[index, replicate] = result
+
+    if workers == 1 or len(missing) <= 1:
+        store(map(run_replicate, params, job_seeds, reports, positions))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            store(pool.map(run_replicate, params, job_seeds, reports, positions))
+
+    return tidy_rows(scenarios, seeds, results), len(missing)
+
+
+def tidy_rows(scenarios, seeds, results):
+    #one row per scenario, replicate and arm with the metrics compared in analyze_comparison
+    rows = []
+    for index, scenario in enumerate(scenarios):
+        for replicate, replicate_seed in enumerate(seeds):
+            result = results[index, replicate]
+            for arm in ARMS:
+                reputations = list(result[arm]['reputations'].values())
+                row = {"scenario": index, **scenario, "replicate": replicate, "seed": replicate_seed, "arm": arm}
+                row.update(summarize_arm(result[arm]))
+                row["average_reputation"] = sum(reputations) / len(reputations)
+                row["stop_reason"] = result[arm]['stop']['reason']
+                rows.append(row)
+    return rows
+
+
+def write_table(rows, path):
+    with open(path, "w", newline="") as table:
+        writer = csv.DictWriter(table, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep simulation scenarios with cached results.")
+    parser.add_argument('--num_orgs', type=int, nargs='+', default=[SCENARIO_DEFAULTS['num_orgs']], help='Values of num_orgs to sweep')
+    parser.add_argument('--num_venues', type=int, nargs='+', default=[SCENARIO_DEFAULTS['num_venues']], help='Values of num_venues to sweep')
+    parser.add_argument('--num_periods', type=int, nargs='+', default=[SCENARIO_DEFAULTS['num_periods']], help='Values of num_periods to sweep')
+    parser.add_argument('--cancellation_rate', type=float, nargs='+', default=[SCENARIO_DEFAULTS['cancellation_rate']], help='Values of cancellation_rate to sweep')
+    parser.add_argument('--stop-tolerance', type=float, default=None, help='Stop each run once its strategy profile and reputations are stationary within this tolerance')
+    parser.add_argument('--stop-window', type=int, default=SCENARIO_DEFAULTS['stop_window'], help='Rounds the run must stay stationary before stopping')
+    parser.add_argument('--scenarios', default=None, help='JSON file with a list of scenarios to run instead of the grid')
+    parser.add_argument('--replicates', type=int, default=1, help='Replicates per scenario')
+    parser.add_argument('--seed', type=int, default=0, help='Seed the replicate seeds are spawned from')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Directory for cached scenario results')
+    parser.add_argument('--output', default='sweep_results.csv', help='CSV file for the result table')
+    parser.add_argument('--cube', default=None, help='Also write every round of every run to this memory-mapped metric cube (computes every point)')
+    args = parser.parse_args()
+
+    #the stopping rule applies to every scenario, unless one from --scenarios sets its own
+    stopping = {"stop_tolerance": args.stop_tolerance, "stop_window": args.stop_window}
+    if args.scenarios:
+        with open(args.scenarios) as scenario_file:
+            scenarios = [{**stopping, **scenario} for scenario in json.load(scenario_file)]
+    else:
+        scenarios = expand_grid({
+            "num_orgs": args.num_orgs,
+            "num_venues": args.num_venues,
+            "num_periods": args.num_periods,
+            "cancellation_rate": args.cancellation_rate,
+            **{name: [value] for name, value in stopping.items()},
+        })
+
+    rows, computed = run_sweep(scenarios, replicates=args.replicates, seed=args.seed, workers=args.workers,
+                               cache=ResultCache(args.cache_dir), cube=args.cube)
+    write_table(rows, args.output)
+    print(f"Wrote {len(rows)} rows for {len(scenarios)} scenarios to {args.output} ({computed} replicates computed, the rest from cache)")
+
+
+if __name__ == "__main__":
+    main()
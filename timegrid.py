@@ -0,0 +1,41 @@
+from schedules import MIN_GAP
+
+HOURS_PER_DAY = 24
+
+
+#The simulated calendar: a number of days, each cut into equal slots between start_hour and end_hour.
+#A slot is keyed by its start time in hours from the beginning of the calendar, day * 24 + hour of day (plus a fraction
+#of an hour for slots shorter than an hour), so the default single day from 8:00 to 24:00 in hourly slots is 8..23.
+#Only this list of slots is kept for the whole calendar; venues and the indexes over them store booked slots only.
+class Calendar:
+    def __init__(self, days=1, start_hour=8, end_hour=24, slot_minutes=60):
+        if days < 1:
+            raise ValueError(f"A calendar needs at least one day, got {days}")
+        if not 0 <= start_hour < end_hour <= HOURS_PER_DAY:
+            raise ValueError(f"Opening hours must satisfy 0 <= start < end <= 24, got {start_hour} to {end_hour}")
+        if slot_minutes <= 0 or 60 % slot_minutes:
+            raise ValueError(f"Slot length must divide an hour, got {slot_minutes} minutes")
+        self.days = days
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        self.slot_minutes = slot_minutes
+        self.slots_per_hour = 60 // slot_minutes
+        if self.slots_per_hour == 1:
+            times = list(range(start_hour, end_hour))
+        else:
+            times = [start_hour + i / self.slots_per_hour for i in range((end_hour - start_hour) * self.slots_per_hour)]
+        self.slots = [day * HOURS_PER_DAY + time for day in range(days) for time in times]
+        #events of one organization stay MIN_GAP hours apart whatever the slot length, also across the night
+        self.min_gap = MIN_GAP
+
+    def __len__(self):
+        return len(self.slots)
+
+    @staticmethod
+    def time_of_day(slot):
+        return slot % HOURS_PER_DAY
+
+    def random_opening_hours(self, rng):
+        #daily (open, close) hours inside the calendar's day: opening up to a quarter of the day late and closing up to a quarter early
+        slack = (self.end_hour - self.start_hour) // 4
+        return self.start_hour + rng.randint(0, slack), self.end_hour - rng.randint(0, slack)
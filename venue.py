@@ -1,36 +1,81 @@
+from events import EventLog, BOOKING
+from timegrid import Calendar
+
+
 class Venue:
-    def __init__(self, name, popularity_level, time_slots):
+    def __init__(self, name, popularity_level, time_slots, log=None, opening_hours=None, capacity=None):
         self.name = name
+        #event log shared with the simulation
+        self.log = log if log is not None else EventLog()
         self.popularity_level = popularity_level
-        self.time_slots = {slot: [] for slot in time_slots}
+        #every slot of the calendar, shared with the simulation rather than copied per venue
+        self.calendar_slots = time_slots
+        #daily (open, close) hours, or None for a venue that is open whenever the calendar is
+        self.opening_hours = opening_hours
+        #most organizations that can share the venue in one slot under the sharing mechanism (None for no limit);
+        #without the mechanism a venue always takes a single booking per slot
+        self.capacity = capacity
+        #organizations booked per slot, as an insertion-ordered member set (dict keys) whose size is the slot's occupancy;
+        #only slots with bookings are present, so memory follows bookings rather than the calendar
+        self.time_slots = {}
+        #occupancy trackers (free-venue index, occupancy grid) notified of every booking and cancellation
+        self.trackers = []
+
+    def attach(self, tracker):
+        self.trackers.append(tracker)
+
+    def is_open(self, slot):
+        if self.opening_hours is None:
+            return True
+        opens, closes = self.opening_hours
+        return opens <= Calendar.time_of_day(slot) < closes
+
+    def occupancy(self, slot):
+        members = self.time_slots.get(slot)
+        return len(members) if members is not None else 0
+
+    def is_full(self, slot):
+        #no room left to share this slot under the mechanism
+        return self.capacity is not None and self.occupancy(slot) >= self.capacity
 
     def is_available(self, slot, enable_mechanism=False):
+        if not self.is_open(slot):
+            return False
         if enable_mechanism:
-            return True
+            return not self.is_full(slot)
         else:
-            return not self.time_slots[slot]
+            return slot not in self.time_slots
 
     def book(self, organization, slot, enable_mechanism=False):
         if self.is_available(slot, enable_mechanism):
-            self.time_slots[slot].append(organization)
+            self.time_slots.setdefault(slot, {})[organization] = None
+            #keep the organization's booking ledger in sync so it can look up its own bookings by slot
+            organization.add_booking(self, slot)
+            for tracker in self.trackers:
+                tracker.booked(self, slot)
             return True
         else:
-            print(f"Venue {self.name} is already booked for time slot {slot}.")
+            self.log.emit(BOOKING, "venue_full", "Venue {venue} is already booked for time slot {slot}.", venue=self.name, slot=slot)
             return False
 
     def cancel_booking(self, slot):
-        if slot in self.time_slots and self.time_slots[slot]:
-            self.time_slots[slot] = []
+        if slot in self.time_slots:
+            for organization in self.time_slots.pop(slot):
+                organization.remove_booking(self, slot)
+            for tracker in self.trackers:
+                tracker.cleared(self, slot)
             return True
         else:
-            print(f"Venue {self.name} is not booked for this time slot {slot}")
+            self.log.emit(BOOKING, "venue_not_booked", "Venue {venue} is not booked for this time slot {slot}", venue=self.name, slot=slot)
             return False
 
     def get_available_time_slots(self, enable_mechanism=False):
-        if enable_mechanism:
-            return list(self.time_slots.keys())
-        else:
-            return [slot for slot, bookings in self.time_slots.items() if not bookings]
+        return [slot for slot in self.calendar_slots if self.is_available(slot, enable_mechanism)]
 
     def reset_venue_bookings(self):
-        self.time_slots = {slot: [] for slot in self.time_slots}
+        for slot, booked_orgs in self.time_slots.items():
+            for organization in booked_orgs:
+                organization.remove_booking(self, slot)
+            for tracker in self.trackers:
+                tracker.cleared(self, slot)
+        self.time_slots = {}
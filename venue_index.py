@@ -0,0 +1,152 @@
+from timegrid import Calendar
+
+#Index of the venues that can take a booking in each time slot, bucketed by popularity level.
+#Venues report bookings and cancellations here, so picking a free venue for a slot no longer means checking every venue.
+#A venue stops taking bookings in a slot once it is booked, or under the sharing mechanism once it is full (at its
+#sharing capacity). The venues open at each time of day are listed once per popularity level, on first use, and shared
+#by every day. A slot gets its own lists of the venues still free (and, with a sharing capacity, of those not yet full)
+#when its first venue is booked (full); they are dropped again once every venue is free, so memory follows the booked
+#slots rather than the size of the calendar. Each list comes with a position map, so taking a venue out, putting it
+#back and drawing a uniformly random available one are all constant time (up to the handful of popularity levels);
+#copying the open venues when a slot gets its first booking is the only step that visits them all.
+class FreeVenueIndex:
+    def __init__(self, venues):
+        self.venues = list(venues)
+        self.levels = sorted({venue.popularity_level for venue in self.venues})
+        #time of day -> popularity level -> venues open then
+        self.open = {}
+        #slot -> popularity level -> venues not booked, in swap-remove lists, and slot -> venue -> position in its list
+        self.free = {}
+        self.free_position = {}
+        #the same for the venues not at their sharing capacity
+        self.room = {}
+        self.room_position = {}
+        for venue in self.venues:
+            for slot in venue.time_slots:
+                self.booked(venue, slot)
+            venue.attach(self)
+
+    def open_venues(self, slot):
+        time = Calendar.time_of_day(slot)
+        levels = self.open.get(time)
+        if levels is None:
+            levels = {level: [] for level in self.levels}
+            for venue in self.venues:
+                if venue.is_open(slot):
+                    levels[venue.popularity_level].append(venue)
+            self.open[time] = levels
+        return levels
+
+    def _take(self, lists, positions, venue, slot):
+        #removes venue from the slot's lists, which start as a copy of the open venues
+        slot_positions = positions.get(slot)
+        if slot_positions is None:
+            slot_lists = lists[slot] = {level: list(bucket) for level, bucket in self.open_venues(slot).items()}
+            slot_positions = positions[slot] = {v: i for bucket in slot_lists.values() for i, v in enumerate(bucket)}
+        position = slot_positions.pop(venue, None)
+        if position is None:
+            return
+        bucket = lists[slot][venue.popularity_level]
+        #move the last venue into the gap so removal does not shift the list
+        last = bucket.pop()
+        if last is not venue:
+            bucket[position] = last
+            slot_positions[last] = position
+
+    def _release(self, lists, positions, venue, slot):
+        slot_positions = positions.get(slot)
+        if slot_positions is None or venue in slot_positions or not venue.is_open(slot):
+            return
+        bucket = lists[slot][venue.popularity_level]
+        slot_positions[venue] = len(bucket)
+        bucket.append(venue)
+        if len(slot_positions) == sum(len(bucket) for bucket in self.open_venues(slot).values()):
+            #every open venue is available again, as in a slot without bookings
+            del lists[slot]
+            del positions[slot]
+
+    def booked(self, venue, slot):
+        self._take(self.free, self.free_position, venue, slot)
+        if venue.is_full(slot):
+            self._take(self.room, self.room_position, venue, slot)
+
+    def cleared(self, venue, slot):
+        #a cancellation clears every booking of the venue in the slot
+        self._release(self.free, self.free_position, venue, slot)
+        self._release(self.room, self.room_position, venue, slot)
+
+    def _available(self, slot, enable_mechanism):
+        #venues that can take another booking in this slot by popularity level, and their position map (None while all open ones can)
+        if enable_mechanism:
+            return self.room.get(slot) or self.open_venues(slot), self.room_position.get(slot)
+        return self.free.get(slot) or self.open_venues(slot), self.free_position.get(slot)
+
+    def free_count(self, slot, max_popularity=None, enable_mechanism=False):
+        levels = self._available(slot, enable_mechanism)[0]
+        return sum(len(bucket) for level, bucket in levels.items() if max_popularity is None or level <= max_popularity)
+
+    def free_lists(self, slot, enable_mechanism=False):
+        #venues that can take a booking in this slot by popularity level (every open venue not yet full with the mechanism)
+        return self._available(slot, enable_mechanism)[0]
+
+    def choose(self, slot, rng, enable_mechanism=False, exclude=None, max_popularity=None):
+        #uniformly random venue that can take a booking in this slot, other than exclude, or None if there is none.
+        #With the sharing mechanism every open venue that is not full can take a booking; otherwise only free ones can.
+        #max_popularity limits the draw to venues up to that popularity level (and so up to that cost).
+        levels, positions = self._available(slot, enable_mechanism)
+        buckets = [bucket for level, bucket in levels.items() if max_popularity is None or level <= max_popularity]
+        total = sum(len(bucket) for bucket in buckets)
+        excluded = (exclude is not None and (max_popularity is None or exclude.popularity_level <= max_popularity)
+                    and (exclude in positions if positions is not None else exclude.is_open(slot)))
+        if total - excluded <= 0:
+            return None
+        #exclude is at most one of two or more venues, so this takes fewer than two draws on average
+        while True:
+            draw = rng.randrange(total)
+            for bucket in buckets:
+                if draw < len(bucket):
+                    venue = bucket[draw]
+                    break
+                draw -= len(bucket)
+            if venue is not exclude:
+                return venue
+
+
+#Free reserve venues per time slot, handed out in the order the reserve venues are listed, which is the order the
+#reserve phase used to scan them in. Only slots with booked reserve venues are stored: the booked positions plus a
+#cursor below which every reserve venue is booked or closed, so taking the next free one is amortized constant time.
+class ReserveQueue:
+    def __init__(self, venues):
+        self.venues = list(venues)
+        self.order = {venue: i for i, venue in enumerate(self.venues)}
+        self.taken = {}
+        self.cursor = {}
+        for venue in self.venues:
+            for slot in venue.time_slots:
+                self.booked(venue, slot)
+            venue.attach(self)
+
+    def booked(self, venue, slot):
+        self.taken.setdefault(slot, set()).add(self.order[venue])
+
+    def cleared(self, venue, slot):
+        taken = self.taken.get(slot)
+        position = self.order[venue]
+        if taken is None or position not in taken:
+            return
+        taken.remove(position)
+        if taken:
+            self.cursor[slot] = min(self.cursor.get(slot, 0), position)
+        else:
+            del self.taken[slot]
+            self.cursor.pop(slot, None)
+
+    def first(self, slot):
+        #first free reserve venue for this slot in list order, or None once the pool for the slot has run dry
+        taken = self.taken.get(slot, ())
+        position = self.cursor.get(slot, 0)
+        while position < len(self.venues) and (position in taken or not self.venues[position].is_open(slot)):
+            position += 1
+        if taken:
+            self.cursor[slot] = position
+        return self.venues[position] if position < len(self.venues) else None